@@ -1,28 +1,102 @@
 """
 Real-Time Fraud Detection API
 FastAPI service for production fraud scoring with <100ms latency
+
+NOTE: Keep pandas/DataFrames off the scoring path - features are filled into
+NumPy row buffers directly (see FeatureComputer and feature_kernels.py).
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field, validator
-from typing import Optional, Dict, Any
+import os
+
+#Single-row scoring is microseconds of tree traversal; OpenMP fan-out only adds
+#overhead and oversubscribes cores under concurrent requests. Must be set before
+#LightGBM initializes OpenMP. The batch path opts back in per call.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
+from anyio import to_thread
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints, ValidationError, field_validator
+from typing import Optional, Dict, Any, Annotated
 import pickle
+import ctypes
 import numpy as np
-import pandas as pd
+import orjson
+import lightgbm as lgb
+from lightgbm.basic import _LIB, _safe_call, _c_str
 from datetime import datetime
+from pathlib import Path
 import time
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+import threading
 from functools import lru_cache
+from cachetools import TTLCache
+
+try:
+    import redis
+except ImportError:  #History falls back to defaults without Redis
+    redis = None
+
+try:
+    from api.feature_kernels import fill_features, fill_matrix, feature_slots, N_KERNEL_INPUTS
+except ImportError:  #Running from inside api/ (python app.py)
+    from feature_kernels import fill_features, fill_matrix, feature_slots, N_KERNEL_INPUTS
 
 #Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+#Background log writer, started in startup_event
+_log_listener = None
+
+
+def _enable_queued_logging():
+    """
+    Route root log records through a queue to a background listener thread
+
+    Request threads only enqueue records; the existing handlers (stderr I/O
+    and their locks) run on the listener thread instead of the hot path.
+    """
+    global _log_listener
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+
+
+def _disable_queued_logging():
+    """Flush queued records, stop the listener and restore the original handlers"""
+    global _log_listener
+    if _log_listener is None:
+        return
+
+    _log_listener.stop()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    for handler in _log_listener.handlers:
+        root.addHandler(handler)
+    _log_listener = None
+
+#Worker threads available to sync endpoints and batch fan-out
+THREADPOOL_SIZE = 64
+
 #Initialize FastAPI app
 app = FastAPI(
     title="Fraud Detection API",
     description="Real-time payment fraud detection service",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  #orjson (Rust) instead of stdlib json encoding
 )
 
 #REQUEST/RESPONSE MODELS
@@ -35,29 +109,26 @@ class Transaction(BaseModel):
     merchant_id: str = Field(..., description="Merchant ID")
     amount: float = Field(..., gt=0, description="Transaction amount in USD")
     currency: str = Field(default="USD", description="Currency code")
-    country: str = Field(..., min_length=2, max_length=2, description="ISO country code")
+    country: Annotated[str, StringConstraints(to_upper=True, min_length=2, max_length=2)] = Field(..., description="ISO country code")
     device_id: str = Field(..., description="Device identifier")
     ip_address: str = Field(..., description="IP address")
     merchant_category_code: str = Field(..., description="MCC code")
     merchant_category: str = Field(..., description="Merchant category")
 
     #Optional contextual fields
-    timestamp: Optional[datetime] = Field(default_factory=datetime.utcnow)
+    timestamp: Optional[int] = Field(default_factory=lambda: int(time.time()), description="Unix epoch seconds (UTC)")
     user_email_domain: Optional[str] = None
     is_first_transaction: Optional[bool] = False
 
-    @validator('amount')
+    @field_validator('amount')
+    @classmethod
     def amount_must_be_reasonable(cls, v):
         if v > 10000:
             logger.warning(f"Large transaction amount: ${v}")
         return v
 
-    @validator('country')
-    def country_must_be_uppercase(cls, v):
-        return v.upper()
-
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "transaction_id": "txn_123456",
                 "user_id": "user_001",
@@ -71,6 +142,7 @@ class Transaction(BaseModel):
                 "merchant_category": "Grocery Stores"
             }
         }
+    )
 
 class FraudScore(BaseModel):
     """Fraud score response schema"""
@@ -83,8 +155,8 @@ class FraudScore(BaseModel):
     processing_time_ms: float = Field(..., description="API processing time in milliseconds")
     model_version: str = Field(default="1.0", description="Model version")
 
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "transaction_id": "txn_123456",
                 "fraud_score": 0.87,
@@ -94,17 +166,38 @@ class FraudScore(BaseModel):
                 "processing_time_ms": 45.2,
                 "model_version": "1.0"
             }
-        }
+        },
+        protected_namespaces=()  #Allow the model_version field
+    )
 
 #MODEL LOADER (Singleton Pattern)
 
+MODEL_PATH = '../models/trained/lightgbm_production.txt'
+MODEL_PICKLE_PATH = '../models/trained/lightgbm_production.pkl'
+
+#Uvicorn worker processes (read by every worker, so set it in the environment rather than per process).
+#Falls back to WEB_CONCURRENCY, uvicorn's own default for --workers, so the thread split matches.
+API_WORKERS = int(os.environ.get('API_WORKERS') or os.environ.get('WEB_CONCURRENCY') or os.cpu_count())
+
+#Threads for single-row /score predictions vs. batched matrix predictions.
+#Batch threads split the cores between workers so a loaded host runs ~cpu_count threads, not cpu_count².
+SINGLE_ROW_NUM_THREADS = 1
+BATCH_NUM_THREADS = int(os.environ.get('BATCH_NUM_THREADS', max(1, os.cpu_count() // API_WORKERS)))
+
+#LightGBM C API constants (see LightGBM/c_api.h)
+C_API_PREDICT_NORMAL = 0
+C_API_DTYPE_FLOAT64 = 1
+
 class ModelLoader:
     """Singleton class to load and cache model"""
 
     _instance = None
     _model = None
+    _booster = None
+    _fast_config = None
     _scaler = None
     _feature_names = None
+    _feature_index = None
     _threshold = 0.950  #Production threshold for 80% recall
 
     def __new__(cls):
@@ -118,9 +211,16 @@ class ModelLoader:
         try:
             logger.info("Loading production model...")
 
-            #Load LightGBM model
-            with open('../models/trained/lightgbm_production.pkl', 'rb') as f:
-                self._model = pickle.load(f)
+            #Load LightGBM model (native text format parses straight into the C++ booster)
+            if Path(MODEL_PATH).exists():
+                self._model = lgb.Booster(model_file=MODEL_PATH)
+            else:
+                logger.warning(f"{MODEL_PATH} not found, falling back to {MODEL_PICKLE_PATH}")
+                with open(MODEL_PICKLE_PATH, 'rb') as f:
+                    self._model = pickle.load(f)
+
+            #Unwrap sklearn API models to the underlying Booster
+            self._booster = getattr(self._model, 'booster_', self._model)
 
             #Load baseline model with scaler (for comparison)
             with open('../models/trained/logistic_regression_baseline.pkl', 'rb') as f:
@@ -131,6 +231,10 @@ class ModelLoader:
             with open('../models/trained/feature_info.pkl', 'rb') as f:
                 feature_info = pickle.load(f)
                 self._feature_names = feature_info['feature_names']
+                self._feature_index = {name: i for i, name in enumerate(self._feature_names)}
+
+            #Pre-configure single-row fast predict (params parsed once, not per request)
+            self._init_fast_predict()
 
             logger.info(f"Model loaded successfully")
             logger.info(f"   Features: {len(self._feature_names)}")
@@ -140,6 +244,57 @@ class ModelLoader:
             logger.error(f"Failed to load model: {e}")
             raise
 
+    def _init_fast_predict(self):
+        """Create a LightGBM FastConfig handle for single-row prediction"""
+        self._fast_config = ctypes.c_void_p()
+        _safe_call(_LIB.LGBM_BoosterPredictForMatSingleRowFastInit(
+            self._booster._handle,
+            ctypes.c_int(C_API_PREDICT_NORMAL),
+            ctypes.c_int(0),                                #start_iteration
+            ctypes.c_int(self._booster.best_iteration),     #<= 0 means all iterations
+            ctypes.c_int(C_API_DTYPE_FLOAT64),
+            ctypes.c_int32(len(self._feature_names)),
+            _c_str(f"num_threads={SINGLE_ROW_NUM_THREADS}"),
+            ctypes.byref(self._fast_config)
+        ))
+
+    def predict_row(self, row: np.ndarray) -> float:
+        """
+        Predict fraud probability for one contiguous float64 feature row
+
+        Only the first n_features values are read; trailing slots are ignored.
+
+        Bypasses the generic Booster.predict wrapper (input conversion,
+        parameter parsing, output allocation) for the /score hot path.
+        """
+        out_len = ctypes.c_int64(0)
+        out_result = ctypes.c_double(0.0)
+        _safe_call(_LIB.LGBM_BoosterPredictForMatSingleRowFast(
+            self._fast_config,
+            row.ctypes.data_as(ctypes.c_void_p),
+            ctypes.byref(out_len),
+            ctypes.byref(out_result)
+        ))
+        return out_result.value
+
+    def predict_batch(self, X: np.ndarray) -> np.ndarray:
+        """Predict fraud probabilities for an (N, n_features) matrix in one call"""
+        return self._booster.predict(X, num_threads=BATCH_NUM_THREADS)
+
+    def close(self):
+        """Release the native fast predict handle"""
+        if self._fast_config is not None:
+            _safe_call(_LIB.LGBM_FastConfigFree(self._fast_config))
+            self._fast_config = None
+
+    @property
+    def feature_index(self):
+        return self._feature_index
+
+    @property
+    def n_features(self):
+        return len(self._feature_names)
+
     @property
     def model(self):
         return self._model
@@ -156,188 +311,328 @@ class ModelLoader:
 #Initialize model loader at startup
 model_loader = ModelLoader()
 
+#FEATURE SLOTS (resolved once from the model's feature order)
+
+N_FEATURES = model_loader.n_features
+_SPILL_SLOT = N_FEATURES  #Sink for features the loaded model does not use
+
+#Row slot for each fill_features output
+_KERNEL_SLOTS = feature_slots(model_loader.feature_index, _SPILL_SLOT)
+
+#Per-thread feature row (N_FEATURES model slots + 1 spill slot), reused across requests
+_tls = threading.local()
+
+def _row_buffer() -> np.ndarray:
+    row = getattr(_tls, 'row', None)
+    if row is None:
+        row = _tls.row = np.empty(N_FEATURES + 1, dtype=np.float64)
+    return row
+
+#HISTORY STORE (Redis)
+
+REDIS_URL = os.environ.get('REDIS_URL')
+HISTORY_CACHE_TTL_S = 5        #Max staleness of a cached bundle
+HISTORY_CACHE_SIZE = 100_000   #Hot (user, device, merchant, ip) tuples kept in-process
+
+#(bundle field, Redis key template, parser) - all fetched in a single MGET
+HISTORY_KEYS = (
+    ('user_avg_amount', 'u:{user_id}:avg_amount', float),
+    ('user_std_amount', 'u:{user_id}:std_amount', float),
+    ('user_last_country', 'u:{user_id}:last_country', str),
+    ('user_country_count_7d', 'u:{user_id}:countries_7d', float),
+    ('user_tx_count_1h', 'u:{user_id}:tx_count_1h', float),
+    ('user_tx_count_24h', 'u:{user_id}:tx_count_24h', float),
+    ('user_amount_sum_24h', 'u:{user_id}:amount_sum_24h', float),
+    ('user_amount_avg_24h', 'u:{user_id}:amount_avg_24h', float),
+    ('user_last_tx_ts', 'u:{user_id}:last_tx_ts', float),
+    ('user_fraud_rate', 'u:{user_id}:fraud_rate', float),
+    ('merchant_avg_amount', 'm:{merchant_id}:avg_amount', float),
+    ('merchant_std_amount', 'm:{merchant_id}:std_amount', float),
+    ('merchant_tx_count_1h', 'm:{merchant_id}:tx_count_1h', float),
+    ('merchant_fraud_rate', 'm:{merchant_id}:fraud_rate', float),
+    ('device_user_count_24h', 'd:{device_id}:users_24h', float),
+    ('device_country_count_7d', 'd:{device_id}:countries_7d', float),
+    ('device_first_seen_ts', 'd:{device_id}:first_seen_ts', float),
+    ('device_fraud_rate', 'd:{device_id}:fraud_rate', float),
+    ('ip_user_count_24h', 'ip:{ip_address}:users_24h', float),
+    ('ip_first_seen_ts', 'ip:{ip_address}:first_seen_ts', float),
+)
+
+_redis = redis.Redis.from_url(REDIS_URL, decode_responses=True) if redis is not None and REDIS_URL else None
+
+
+@lru_cache(maxsize=HISTORY_CACHE_SIZE)
+def _fetch_history_cached(user_id: str, device_id: str, merchant_id: str, ip_address: str,
+                          time_bucket: int) -> Dict[str, Any]:
+    if _redis is None:
+        return {}
+
+    keys = [
+        template.format(user_id=user_id, device_id=device_id, merchant_id=merchant_id, ip_address=ip_address)
+        for _, template, _ in HISTORY_KEYS
+    ]
+    try:
+        values = _redis.mget(keys)
+    except redis.RedisError as e:
+        logger.warning(f"History lookup failed, using defaults: {e}")
+        return {}
+
+    return {field: parse(v) for (field, _, parse), v in zip(HISTORY_KEYS, values) if v is not None}
+
+
+def fetch_history_bundle(user_id: str, device_id: str, merchant_id: str, ip_address: str) -> Dict[str, Any]:
+    """
+    Fetch all history aggregates for a transaction in one Redis round trip
+
+    Results are cached in-process per HISTORY_CACHE_TTL_S time bucket. Missing
+    keys (or no Redis configured) are omitted so callers fall back to defaults.
+    The returned dict is shared between cache hits and must not be mutated.
+    """
+    time_bucket = int(time.time() // HISTORY_CACHE_TTL_S)
+    return _fetch_history_cached(user_id, device_id, merchant_id, ip_address, time_bucket)
+
+
 #FEATURE ENGINEERING (Real-time)
 
+#Built once at import; O(1) membership instead of a per-request list scan
+HIGH_RISK_COUNTRIES = frozenset(('NG', 'PK', 'BD', 'VN', 'ID'))
+
 class FeatureComputer:
     """Compute features for a single transaction in real-time"""
 
-    #In-memory cache for user/device/merchant history (production would use Redis)
-    _history = {
-        'user_transactions': {},
-        'device_users': {},
-        'merchant_transactions': {},
-        'user_fraud_history': {},
-        'device_fraud_history': {},
-        'merchant_fraud_history': {}
-    }
-
-    def __init__(self, transaction: Transaction):
+    def __init__(self, transaction: Transaction, out: Optional[np.ndarray] = None,
+                 history: Optional[Dict[str, Any]] = None):
         self.txn = transaction
-        self.timestamp = transaction.timestamp or datetime.utcnow()
-        self.features = {}
-
-    def compute_all_features(self) -> Dict[str, float]:
-        """Compute all 35 features for the transaction"""
-
-        #Simple features (always available)
-        self._compute_temporal_features()
-        self._compute_amount_features()
-        self._compute_geo_features()
-
-        #Historical features (use cache/database)
-        self._compute_velocity_features()
-        self._compute_device_risk_features()
-        self._compute_historical_risk_features()
-
-        return self.features
-
-    def _compute_temporal_features(self):
-        """Time-based features"""
-        hour = self.timestamp.hour
-        day_of_week = self.timestamp.weekday()
-
-        self.features['feat_hour'] = hour
-        self.features['feat_day_of_week'] = day_of_week
-        self.features['feat_is_weekend'] = 1 if day_of_week >= 5 else 0
-        self.features['feat_is_night'] = 1 if 0 <= hour < 6 else 0
-
-        #Cyclical encoding
-        self.features['feat_hour_sin'] = np.sin(2 * np.pi * hour / 24)
-        self.features['feat_hour_cos'] = np.cos(2 * np.pi * hour / 24)
-        self.features['feat_day_sin'] = np.sin(2 * np.pi * day_of_week / 7)
-        self.features['feat_day_cos'] = np.cos(2 * np.pi * day_of_week / 7)
-
-    def _compute_amount_features(self):
-        """Amount-based features"""
-        amount = self.txn.amount
-
-        self.features['feat_is_small_amount'] = 1 if amount < 10 else 0
-        self.features['feat_is_large_amount'] = 1 if amount > 500 else 0
-
-        #User average (from cache/default)
-        user_avg = self._get_user_avg_amount()
-        user_std = self._get_user_std_amount()
-        self.features['feat_amount_vs_user_avg'] = (amount - user_avg) / (user_std + 1)
-
-        #Merchant average (from cache/default)
-        merchant_avg = self._get_merchant_avg_amount()
-        merchant_std = self._get_merchant_std_amount()
-        self.features['feat_amount_vs_merchant_avg'] = (amount - merchant_avg) / (merchant_std + 1)
-
-        #Percentile (simplified)
-        self.features['feat_amount_percentile_user'] = min(amount / 1000, 1.0)
-
-    def _compute_geo_features(self):
-        """Geographic features"""
-        HIGH_RISK_COUNTRIES = ['NG', 'PK', 'BD', 'VN', 'ID']
-
-        self.features['feat_is_high_risk_country'] = 1 if self.txn.country in HIGH_RISK_COUNTRIES else 0
-        self.features['feat_country_change'] = self._check_country_change()
-        self.features['feat_unique_countries_user_7d'] = self._get_user_country_count()
-        self.features['feat_user_country_entropy'] = 0.0  #Simplified for production
-
-    def _compute_velocity_features(self):
-        """Velocity features from recent history"""
-        self.features['feat_tx_count_user_1h'] = self._get_user_tx_count_1h()
-        self.features['feat_tx_count_user_24h'] = self._get_user_tx_count_24h()
-        self.features['feat_amount_sum_user_24h'] = self._get_user_amount_sum_24h()
-        self.features['feat_amount_avg_user_24h'] = self._get_user_amount_avg_24h()
-        self.features['feat_time_since_last_tx_mins'] = self._get_time_since_last_tx()
-        self.features['feat_tx_count_merchant_1h'] = self._get_merchant_tx_count_1h()
-
-    def _compute_device_risk_features(self):
-        """Device and IP risk features"""
-        self.features['feat_unique_users_per_device_24h'] = self._get_device_user_count()
-        self.features['feat_unique_countries_per_device_7d'] = self._get_device_country_count()
-        self.features['feat_unique_users_per_ip_24h'] = self._get_ip_user_count()
-        self.features['feat_device_age_days'] = self._get_device_age()
-        self.features['feat_ip_age_days'] = self._get_ip_age()
-
-    def _compute_historical_risk_features(self):
-        """Historical fraud rates"""
-        self.features['feat_user_fraud_rate_historical'] = self._get_user_fraud_rate()
-        self.features['feat_merchant_fraud_rate_historical'] = self._get_merchant_fraud_rate()
-        self.features['feat_device_fraud_rate_historical'] = self._get_device_fraud_rate()
-
-    #Helper methods (these would query Redis/database in production)
-    def _get_user_avg_amount(self): return 150.0
-    def _get_user_std_amount(self): return 75.0
-    def _get_merchant_avg_amount(self): return 100.0
-    def _get_merchant_std_amount(self): return 50.0
-    def _check_country_change(self): return 0
-    def _get_user_country_count(self): return 1
-    def _get_user_tx_count_1h(self): return 1
-    def _get_user_tx_count_24h(self): return 3
-    def _get_user_amount_sum_24h(self): return self.txn.amount * 3
-    def _get_user_amount_avg_24h(self): return self.txn.amount
-    def _get_time_since_last_tx(self): return 120.0
-    def _get_merchant_tx_count_1h(self): return 10
-    def _get_device_user_count(self): return 1
-    def _get_device_country_count(self): return 1
-    def _get_ip_user_count(self): return 1
-    def _get_device_age(self): return 30.0
-    def _get_ip_age(self): return 15.0
-    def _get_user_fraud_rate(self): return 0.0
-    def _get_merchant_fraud_rate(self): return 0.01
-    def _get_device_fraud_rate(self): return 0.0
+        self.timestamp = transaction.timestamp if transaction.timestamp is not None else int(time.time())
+        self.f = out
+
+        #User/device/merchant/IP aggregates (one Redis MGET, cached for hot keys)
+        if history is None:
+            history = fetch_history_bundle(
+                transaction.user_id, transaction.device_id, transaction.merchant_id, transaction.ip_address
+            )
+        self.history = history
+
+    def compute_all_features(self) -> None:
+        """Gather raw inputs and fill the row buffer in a single compiled call"""
+        fill_features(self.f, _KERNEL_SLOTS, *self.kernel_inputs())
+
+    def kernel_inputs(self) -> tuple:
+        """Raw scalar inputs to the feature kernel, in fill_features argument order"""
+        return (
+            #Temporal (UTC, integer math on epoch seconds; 1970-01-01 was a Thursday = weekday 3)
+            (self.timestamp // 3600) % 24, (self.timestamp // 86400 + 3) % 7,
+            #Amount (user/merchant baselines from cache/default)
+            self.txn.amount,
+            self._get_user_avg_amount(), self._get_user_std_amount(),
+            self._get_merchant_avg_amount(), self._get_merchant_std_amount(),
+            #Geo
+            self._is_high_risk_country(), self._check_country_change(), self._get_user_country_count(),
+            #Velocity (from cache/database)
+            self._get_user_tx_count_1h(), self._get_user_tx_count_24h(),
+            self._get_user_amount_sum_24h(), self._get_user_amount_avg_24h(),
+            self._get_time_since_last_tx(), self._get_merchant_tx_count_1h(),
+            #Device/IP risk
+            self._get_device_user_count(), self._get_device_country_count(), self._get_ip_user_count(),
+            self._get_device_age(), self._get_ip_age(),
+            #Historical fraud rates
+            self._get_user_fraud_rate(), self._get_merchant_fraud_rate(), self._get_device_fraud_rate()
+        )
+
+    def _is_high_risk_country(self):
+        return 1 if self.txn.country in HIGH_RISK_COUNTRIES else 0
+
+    def _seconds_since(self, epoch_s):
+        return self.timestamp - epoch_s
+
+    #Helper methods (history bundle lookups, with defaults when a key is missing)
+    def _get_user_avg_amount(self): return self.history.get('user_avg_amount', 150.0)
+    def _get_user_std_amount(self): return self.history.get('user_std_amount', 75.0)
+    def _get_merchant_avg_amount(self): return self.history.get('merchant_avg_amount', 100.0)
+    def _get_merchant_std_amount(self): return self.history.get('merchant_std_amount', 50.0)
+
+    def _check_country_change(self):
+        last_country = self.history.get('user_last_country')
+        return 1 if last_country is not None and last_country != self.txn.country else 0
+
+    def _get_user_country_count(self): return self.history.get('user_country_count_7d', 1)
+    def _get_user_tx_count_1h(self): return self.history.get('user_tx_count_1h', 1)
+    def _get_user_tx_count_24h(self): return self.history.get('user_tx_count_24h', 3)
+    def _get_user_amount_sum_24h(self): return self.history.get('user_amount_sum_24h', self.txn.amount * 3)
+    def _get_user_amount_avg_24h(self): return self.history.get('user_amount_avg_24h', self.txn.amount)
+
+    def _get_time_since_last_tx(self):
+        last_tx_ts = self.history.get('user_last_tx_ts')
+        return 120.0 if last_tx_ts is None else self._seconds_since(last_tx_ts) / 60
+
+    def _get_merchant_tx_count_1h(self): return self.history.get('merchant_tx_count_1h', 10)
+    def _get_device_user_count(self): return self.history.get('device_user_count_24h', 1)
+    def _get_device_country_count(self): return self.history.get('device_country_count_7d', 1)
+    def _get_ip_user_count(self): return self.history.get('ip_user_count_24h', 1)
+
+    def _get_device_age(self):
+        first_seen = self.history.get('device_first_seen_ts')
+        return 30.0 if first_seen is None else self._seconds_since(first_seen) / 86400
+
+    def _get_ip_age(self):
+        first_seen = self.history.get('ip_first_seen_ts')
+        return 15.0 if first_seen is None else self._seconds_since(first_seen) / 86400
+
+    def _get_user_fraud_rate(self): return self.history.get('user_fraud_rate', 0.0)
+    def _get_merchant_fraud_rate(self): return self.history.get('merchant_fraud_rate', 0.01)
+    def _get_device_fraud_rate(self): return self.history.get('device_fraud_rate', 0.0)
 
 #SCORING ENGINE
 
+#Short-lived cache of scores for identical transactions (retries, replays, card testing)
+SCORE_CACHE_SIZE = 50_000
+SCORE_CACHE_TTL_S = 60
+_score_cache = TTLCache(maxsize=SCORE_CACHE_SIZE, ttl=SCORE_CACHE_TTL_S)
+_score_cache_lock = threading.RLock()
+
+#Decision tier = (score >= 0.7 * threshold) + (score >= threshold)
+DECISION_TIERS = (
+    ("APPROVE", "LOW", "Low fraud score ({:.1f}%) - transaction approved"),
+    ("REVIEW", "MEDIUM", "Moderate fraud score ({:.1f}%) - requires manual review"),
+    ("BLOCK", "HIGH", "High fraud score ({:.1f}%) - multiple suspicious signals"),
+)
+
+
+def _build_fraud_score(transaction: Transaction, fraud_score: float, tier: int,
+                       processing_time_ms: float) -> FraudScore:
+    """Assemble the response for a scored transaction"""
+    decision, risk_level, reason = DECISION_TIERS[tier]
+    return FraudScore(
+        transaction_id=transaction.transaction_id,
+        fraud_score=round(fraud_score, 4),
+        decision=decision,
+        reason=reason.format(fraud_score * 100),
+        risk_level=risk_level,
+        processing_time_ms=round(processing_time_ms, 2),
+        model_version="1.0"
+    )
+
+
+def _predict_score(transaction: Transaction) -> float:
+    """Compute features into this thread's row buffer and predict"""
+    row = _row_buffer()
+    row.fill(0.0)
+    FeatureComputer(transaction, row).compute_all_features()
+
+    #Reads the first N_FEATURES slots
+    return model_loader.predict_row(row)
+
+
+def _cached_score(transaction: Transaction) -> float:
+    """
+    Fraud score for a transaction, memoized for retries/replays
+
+    The key is the transaction's own fields with the timestamp bucketed to the hour;
+    transaction_id and processing time are left out so retries hit. The Redis history
+    bundle and the exact timestamp within the hour (time since last tx, device/IP age)
+    are not in the key, so a hit can be up to SCORE_CACHE_TTL_S seconds stale.
+    First transactions are never cached.
+    """
+    if transaction.is_first_transaction:
+        return _predict_score(transaction)
+
+    ts = transaction.timestamp if transaction.timestamp is not None else int(time.time())
+    key = (
+        transaction.user_id,
+        transaction.merchant_id,
+        transaction.device_id,
+        transaction.ip_address,
+        transaction.amount,  #Exact: int(amount * 100) truncates, e.g. 0.29 -> 28
+        transaction.country,
+        ts // 3600  #Hour bucket (hour/weekday features)
+    )
+
+    with _score_cache_lock:
+        fraud_score = _score_cache.get(key)
+    if fraud_score is None:
+        fraud_score = _predict_score(transaction)
+        with _score_cache_lock:
+            _score_cache[key] = fraud_score
+    return fraud_score
+
+
 def score_transaction(transaction: Transaction) -> FraudScore:
     """Score a single transaction"""
 
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()  #Monotonic, integer ns
 
     try:
-        #1. Compute features
-        feature_computer = FeatureComputer(transaction)
-        features_dict = feature_computer.compute_all_features()
-
-        #2. Prepare feature vector in correct order
-        feature_vector = [features_dict.get(name, 0.0) for name in model_loader.feature_names]
-        X = np.array(feature_vector).reshape(1, -1)
+        #1-2. Compute features and predict (or reuse a recent identical score)
+        fraud_score = _cached_score(transaction)
 
-        #3. Get prediction
-        fraud_score = float(model_loader.model.predict(X)[0])
-
-        #4. Make decision based on threshold
+        #3. Make decision based on threshold
         threshold = model_loader.threshold
+        tier = (fraud_score >= threshold * 0.7) + (fraud_score >= threshold)
 
-        if fraud_score >= threshold:
-            decision = "BLOCK"
-            risk_level = "HIGH"
-            reason = f"High fraud score ({fraud_score*100:.1f}%) - multiple suspicious signals"
-        elif fraud_score >= threshold * 0.7:
-            decision = "REVIEW"
-            risk_level = "MEDIUM"
-            reason = f"Moderate fraud score ({fraud_score*100:.1f}%) - requires manual review"
-        else:
-            decision = "APPROVE"
-            risk_level = "LOW"
-            reason = f"Low fraud score ({fraud_score*100:.1f}%) - transaction approved"
-
-        #5. Calculate processing time
-        processing_time_ms = (time.time() - start_time) * 1000
+        #4. Calculate processing time
+        processing_time_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
 
         #Log performance
-        logger.info(f"Transaction {transaction.transaction_id}: score={fraud_score:.3f}, decision={decision}, time={processing_time_ms:.1f}ms")
-
-        return FraudScore(
-            transaction_id=transaction.transaction_id,
-            fraud_score=round(fraud_score, 4),
-            decision=decision,
-            reason=reason,
-            risk_level=risk_level,
-            processing_time_ms=round(processing_time_ms, 2),
-            model_version="1.0"
-        )
+        logger.info("Transaction %s: score=%.3f, decision=%s, time=%.1fms",
+                    transaction.transaction_id, fraud_score, DECISION_TIERS[tier][0], processing_time_ms)
+
+        return _build_fraud_score(transaction, fraud_score, tier, processing_time_ms)
 
     except Exception as e:
         logger.error(f"Error scoring transaction {transaction.transaction_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Scoring error: {str(e)}")
 
+
+def score_transactions_batch(transactions: list[Transaction]) -> list:
+    """
+    Score a batch of transactions with a single model call
+
+    Features are written into one (N, F) matrix and predicted together, so
+    LightGBM's per-call overhead is paid once per batch. Items whose
+    features fail to compute are returned as error entries.
+    processing_time_ms is the batch time amortized per transaction.
+    """
+
+    start_ns = time.perf_counter_ns()  #Monotonic, integer ns
+
+    #1. Gather raw kernel inputs per transaction (history lookups stay in Python)
+    inputs = np.zeros((len(transactions), N_KERNEL_INPUTS), dtype=np.float64)
+    errors = {}
+    for i, txn in enumerate(transactions):
+        try:
+            inputs[i] = FeatureComputer(txn).kernel_inputs()
+        except Exception as e:
+            logger.error(f"Failed to score {txn.transaction_id}: {e}")
+            errors[i] = str(e)
+
+    #2. Compute features for all rows in parallel (N_FEATURES slots + spill)
+    X = np.zeros((len(transactions), N_FEATURES + 1), dtype=np.float64)
+    fill_matrix(X, _KERNEL_SLOTS, inputs)
+
+    #3. One prediction call for the whole batch
+    scores = model_loader.predict_batch(X[:, :N_FEATURES])
+
+    #4. Decisions for all rows at once
+    threshold = model_loader.threshold
+    tiers = (scores >= threshold * 0.7).astype(np.int8) + (scores >= threshold)
+
+    processing_time_ms = (time.perf_counter_ns() - start_ns) / 1_000_000 / max(len(transactions), 1)
+
+    results = []
+    for i, txn in enumerate(transactions):
+        if i in errors:
+            results.append({"transaction_id": txn.transaction_id, "error": errors[i]})
+        else:
+            results.append(_build_fraud_score(txn, float(scores[i]), int(tiers[i]), processing_time_ms))
+
+    return results
+
 #API ENDPOINTS
 
+#/batch_score limits, checked before request validation
+MAX_BATCH_SIZE = 100
+MAX_BATCH_BYTES = 256_000
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -362,38 +657,81 @@ async def health_check():
 
 
 @app.post("/score", response_model=FraudScore)
-async def score_endpoint(transaction: Transaction):
+def score_endpoint(transaction: Transaction):
     """
     Score a transaction for fraud
 
     Returns fraud score (0-1) and decision (APPROVE/REVIEW/BLOCK)
+    Plain def: CPU-bound, so FastAPI runs it in the worker threadpool, not on the event loop
     """
     return score_transaction(transaction)
 
 
-@app.post("/batch_score")
-async def batch_score_endpoint(transactions: list[Transaction]):
+@app.post(
+    "/batch_score",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {
+                "type": "array",
+                "items": {"$ref": "#/components/schemas/Transaction"},
+                "maxItems": MAX_BATCH_SIZE
+            }}}
+        }
+    }
+)
+async def batch_score_endpoint(request: Request):
     """
     Score multiple transactions in batch
 
     More efficient for bulk processing
+    Size limits are enforced on the raw body before any Pydantic validation,
+    so oversized payloads are rejected without paying per-item parsing cost.
     """
-    if len(transactions) > 100:
-        raise HTTPException(status_code=400, detail="Batch size limited to 100 transactions")
-
-    results = []
-    for txn in transactions:
+    #1. Reject by declared size, then cap the bytes actually read
+    try:
+        content_length = int(request.headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Content-Length header must be an integer")
+    if content_length > MAX_BATCH_BYTES:
+        raise HTTPException(status_code=413, detail=f"Batch payload limited to {MAX_BATCH_BYTES} bytes")
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_BATCH_BYTES:
+            raise HTTPException(status_code=413, detail=f"Batch payload limited to {MAX_BATCH_BYTES} bytes")
+
+    #2. Cheap structural checks on the parsed JSON
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Request body must be valid JSON")
+
+    if not isinstance(data, list):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON list of transactions")
+    if len(data) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch size limited to {MAX_BATCH_SIZE} transactions")
+
+    #3. Only now validate each transaction, reporting every bad item at ("body", index, ...)
+    transactions = []
+    errors = []
+    for i, item in enumerate(data):
         try:
-            score = score_transaction(txn)
-            results.append(score)
-        except Exception as e:
-            logger.error(f"Failed to score {txn.transaction_id}: {e}")
-            results.append({
-                "transaction_id": txn.transaction_id,
-                "error": str(e)
-            })
+            transactions.append(Transaction.model_validate(item))
+        except ValidationError as e:
+            errors.extend({**err, "loc": ("body", i, *err["loc"])} for err in e.errors())
+    if errors:
+        raise RequestValidationError(errors)
 
-    return {"results": results, "total": len(results)}
+    #Vectorized scoring runs in the threadpool so it never blocks the event loop
+    results = await run_in_threadpool(score_transactions_batch, transactions)
+
+    #Serialize directly, skipping jsonable_encoder's reflective walk over every result
+    return ORJSONResponse({
+        "results": [r.model_dump() if isinstance(r, FraudScore) else r for r in results],
+        "total": len(results)
+    })
 
 
 @app.get("/model/info")
@@ -414,9 +752,15 @@ async def model_info():
 @app.on_event("startup")
 async def startup_event():
     """Initialize on startup"""
+    _enable_queued_logging()
     logger.info("Starting Fraud Detection API...")
+
+    #Raise anyio's default worker thread limit (40) for threadpooled scoring
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
     logger.info(f"   Model threshold: {model_loader.threshold}")
     logger.info(f"   Features: {len(model_loader.feature_names)}")
+    logger.info(f"   Threadpool size: {THREADPOOL_SIZE}")
+    logger.info(f"   History store: {'Redis' if _redis is not None else 'defaults (REDIS_URL not set)'}")
     logger.info("API ready to accept requests")
 
 
@@ -424,8 +768,21 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Fraud Detection API...")
+    model_loader.close()
+    _disable_queued_logging()
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    #Workers need an import string; each worker process loads its own ModelLoader
+    app_path = f"{__package__}.app:app" if __package__ else "app:app"
+    uvicorn.run(
+        app_path,
+        host="0.0.0.0",
+        port=8000,
+        workers=API_WORKERS,
+        loop="uvloop",
+        http="httptools",
+        log_level="warning"
+    )
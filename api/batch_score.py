@@ -10,21 +10,73 @@ This script:
 5. Measures latency statistics
 """
 
+import argparse
+import os
 import pandas as pd
-import requests
+import httpx
+import asyncio
 import numpy as np
 import time
 import json
+import orjson
 import pickle
+import lightgbm as lgb
 from tqdm import tqdm
 from pathlib import Path
 import sys
-
-API_URL = "http://localhost:8000/score"
+import socket
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+#Loopback IP skips name resolution on every new connection
+API_BASE = "http://127.0.0.1:8000"
+BATCH_API_URL = f"{API_BASE}/batch_score"
 TEST_DATA_PATH = "../data/processed/test.csv"
-MODEL_PATH = "../models/trained/lightgbm_production.pkl"
+MODEL_PATH = "../models/trained/lightgbm_production.txt"
+MODEL_PICKLE_PATH = "../models/trained/lightgbm_production.pkl"
 OUTPUT_DIR = "../evaluation/reports/api_validation/"
 
+#Client-side concurrency and batching (BATCH_SIZE matches the server's MAX_BATCH_SIZE)
+MAX_CONCURRENCY = 64
+BATCH_SIZE = 100
+BATCH_MAX_WAIT_MS = 10
+MAX_CONSECUTIVE_ERRORS = 10
+
+#Connection reuse: explicit keep-alive, no compression on tiny JSON bodies, no Nagle delay
+KEEPALIVE_EXPIRY_S = 30.0
+CLIENT_HEADERS = {
+    'Content-Type': 'application/json',
+    'Connection': 'keep-alive',
+    'Accept-Encoding': 'identity'
+}
+SOCKET_OPTIONS = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+
+#Retry throttled/overloaded responses with exponential backoff
+MAX_RETRIES = 3
+RETRY_BACKOFF_S = 0.05
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+#Explicit dtypes for test.csv: MCC and dates stay strings, as the API expects / JSON allows
+TEST_DATA_DTYPES = {
+    'is_fraud': np.int8,
+    'merchant_category_code': str,
+    'timestamp': str,
+    'chargeback_date': str
+}
+
+#Request fields of api.app.Transaction; every other test.csv column (feat_*, labels, dates) is
+#ignored by the API, so it is not serialized. timestamp is excluded: the API expects epoch seconds.
+API_TRANSACTION_FIELDS = (
+    'transaction_id', 'user_id', 'merchant_id', 'amount', 'currency', 'country',
+    'device_id', 'ip_address', 'merchant_category_code', 'merchant_category',
+    'user_email_domain', 'is_first_transaction',
+)
+
 #Decision thresholds (match your production model)
 BLOCK_THRESHOLD = 0.95
 REVIEW_THRESHOLD = 0.665
@@ -33,7 +85,7 @@ REVIEW_THRESHOLD = 0.665
 def check_api_health():
     """Check if API is running"""
     try:
-        response = requests.get("http://localhost:8000/health", timeout=2)
+        response = httpx.get(f"{API_BASE}/health", timeout=2, trust_env=False)
         if response.status_code == 200:
             print("API is running")
             return True
@@ -58,13 +110,19 @@ def load_test_data():
         print("\nThis will create train.csv and test.csv in data/processed/")
         sys.exit(1)
     
-    df = pd.read_csv(TEST_DATA_PATH)
+    #pyarrow parses multithreaded (and float-exact); fall back to the C parser without it
+    read_kwargs = {'engine': 'pyarrow'} if pa is not None else {}
+    df = pd.read_csv(TEST_DATA_PATH, dtype=TEST_DATA_DTYPES, **read_kwargs)
+    
+    #Cast once so API payloads need no per-row coercion (labels stay integer)
+    num_cols = df.select_dtypes(include=np.number).columns.drop('is_fraud', errors='ignore')
+    df[num_cols] = df[num_cols].astype(np.float64)
     print(f"Loaded {len(df):,} test transactions")
     
     if 'is_fraud' in df.columns:
         print(f"   Fraud rate: {df['is_fraud'].mean()*100:.2f}%")
         print(f"   Fraud cases: {df['is_fraud'].sum():,}")
-        print(f"   Legitimate: {(~df['is_fraud']).sum():,}")
+        print(f"   Legitimate: {(df['is_fraud'] == 0).sum():,}")
     else:
         print("Warning: 'is_fraud' column not found!")
         sys.exit(1)
@@ -76,190 +134,376 @@ def load_offline_model():
     """Load the same model the API uses for comparison"""
     print("LOADING OFFLINE MODEL")
     
-    if not Path(MODEL_PATH).exists():
+    #Native LightGBM text model: faster to load and not tied to the pickling library version
+    if Path(MODEL_PATH).exists():
+        model = lgb.Booster(model_file=MODEL_PATH)
+        print(f"Model loaded from: {MODEL_PATH}")
+        return model
+    
+    if not Path(MODEL_PICKLE_PATH).exists():
         print(f"Model not found at: {MODEL_PATH}")
         print("\nPlease train your model first:")
         print("   python models/train_model.py")
         sys.exit(1)
     
-    with open(MODEL_PATH, 'rb') as f:
+    with open(MODEL_PICKLE_PATH, 'rb') as f:
         model = pickle.load(f)
     
-    print(f"Model loaded from: {MODEL_PATH}")
+    #Unwrap sklearn API models to the underlying Booster
+    model = getattr(model, 'booster_', model)
+    
+    print(f"Model loaded from: {MODEL_PICKLE_PATH}")
     return model
 
 
-def prepare_transaction_for_api(row):
-    """Convert dataframe row to API request format"""
-    exclude_cols = ['is_fraud', 'timestamp']
-    transaction = {k: v for k, v in row.items() 
-                   if k not in exclude_cols and pd.notna(v)}
-    
-    #Convert numpy types to Python types
-    transaction = {k: (float(v) if isinstance(v, (np.integer, np.floating)) else v) 
-                   for k, v in transaction.items()}
-    
-    #Fix merchant_category_code - API expects string
-    if 'merchant_category_code' in transaction:
-        transaction['merchant_category_code'] = str(int(transaction['merchant_category_code']))
-    
-    return transaction
+def prepare_transactions_for_api(df):
+    """
+    Convert dataframe rows to API request format
+
+    Only the columns the API's Transaction model reads (API_TRANSACTION_FIELDS)
+    are sent. Expects the column types set by load_test_data (numeric columns
+    as float64, MCC as string), so rows export with to_dict('records') and no
+    per-value coercion.
+    """
+    prep_df = df[[col for col in API_TRANSACTION_FIELDS if col in df.columns]]
+
+    #Missing values become JSON null
+    prep_df = prep_df.astype(object).where(prep_df.notna(), None)
+
+    return prep_df.to_dict('records')
+
+
+def latency_stats(latencies):
+    """Summary statistics for a latency list (one sort for all percentiles)"""
+    lat_arr = np.asarray(latencies, dtype=np.float64)
+    p50, p95, p99 = np.percentile(lat_arr, [50, 95, 99])
+    return {
+        'mean_ms': float(lat_arr.mean()),
+        'median_ms': float(p50),
+        'std_ms': float(lat_arr.std()),
+        'min_ms': float(lat_arr.min()),
+        'max_ms': float(lat_arr.max()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99)
+    }
+
+
+async def _score_batch(sem, client, transactions, start, out, state, pbar):
+    """
+    Score one chunk through /batch_score, writing results into out[start:start+len]
+
+    Concurrency is bounded by the shared semaphore. state tracks errors across
+    coroutines so a crashed API stops the run early. Each result carries the
+    request latency amortized over the chunk.
+    """
+    async with sem:
+        if state['stop']:
+            return
+
+        body = orjson.dumps(transactions)
+
+        try:
+            #Back off only when the server says so (429/5xx), not on a fixed schedule
+            for attempt in range(MAX_RETRIES + 1):
+                #Measure latency
+                start_ns = time.perf_counter_ns()
+                response = await client.post(BATCH_API_URL, content=body)
+                latency_ms = (time.perf_counter_ns() - start_ns) / 1e6
+
+                if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+                    break
+                await asyncio.sleep(2 ** attempt * RETRY_BACKOFF_S)
+
+            if response.status_code == 200:
+                predictions = orjson.loads(response.content)['results']
+                state['consecutive_errors'] = 0  #Reset on success
+                state['request_latencies'].append(latency_ms)
+
+                out['latency_ms'][start:start + len(transactions)] = latency_ms / len(transactions)
+                for i, prediction in enumerate(predictions, start):
+                    if 'error' in prediction:
+                        state['errors'] += 1
+                        if not state['error_messages']:
+                            state['error_messages'].append(f"Item failed: {prediction['error'][:100]}")
+                        continue
+                    out['fraud_score'][i] = prediction.get('fraud_score', prediction.get('fraud_probability', 0))
+                    out['decision'][i] = prediction.get('decision', 'UNKNOWN')
+                    out['ok'][i] = True
+                return
+
+            error_msg = f"Status {response.status_code}: {response.text[:100]}"
+
+        except httpx.ConnectError as e:
+            error_msg = f"Connection failed: {str(e)[:100]}"
+
+            #Stop if API server has crashed
+            if state['consecutive_errors'] + 1 >= MAX_CONSECUTIVE_ERRORS and not state['stop']:
+                state['stop'] = True
+                print(f"\nToo many consecutive errors ({state['consecutive_errors'] + 1})!")
+                print("API server may have crashed. Stopping early.")
+
+        except Exception as e:
+            error_msg = f"Request failed: {str(e)[:100]}"
 
+        finally:
+            pbar.update(len(transactions))
 
-def score_through_api(test_df, sample_size=None, show_progress=True):
+        #Whole chunk failed
+        state['errors'] += len(transactions)
+        state['consecutive_errors'] += 1
+        if state['consecutive_errors'] <= 3:
+            print(f"\n{error_msg}")
+        if not state['error_messages']:
+            state['error_messages'].append(error_msg)
+
+
+class BatchScheduler:
+    """
+    Packs submitted transactions into /batch_score requests
+
+    A batch is flushed when it reaches max_size or when its oldest transaction
+    has waited max_wait_ms, whichever comes first. When everything arrives at
+    once (offline validation) this reduces to fixed-size chunks; with paced
+    arrivals it behaves like a serving-side dynamic batcher.
+    """
+
+    def __init__(self, flush, max_size=BATCH_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self._flush = flush  #async flush(start, items)
+        self._max_size = max_size
+        self._max_wait_s = max_wait_ms / 1000
+        self._pending = []
+        self._start = 0  #Submission index of the first pending item
+        self._deadline = None
+        self._tasks = []
+
+    def submit(self, item):
+        """Queue one transaction (must be called from the event loop)"""
+        if not self._pending:
+            #Arrival of the batch head starts its deadline
+            self._deadline = asyncio.get_running_loop().call_later(self._max_wait_s, self._dispatch)
+        self._pending.append(item)
+
+        if len(self._pending) >= self._max_size:
+            self._dispatch()
+
+    def _dispatch(self):
+        if not self._pending:
+            return
+        self._deadline.cancel()
+        batch, self._pending = self._pending, []
+        self._tasks.append(asyncio.create_task(self._flush(self._start, batch)))
+        self._start += len(batch)
+
+    async def drain(self):
+        """Flush any partial batch and wait for every request to finish"""
+        self._dispatch()
+        await asyncio.gather(*self._tasks)
+
+
+async def _score_records(prepared, concurrency, batch_size, max_wait_ms, arrival_rate, show_progress):
+    """
+    Score prepared payloads in order; returns (out, state)
+
+    out holds preallocated result columns indexed like `prepared`; state holds
+    error counts and per-request latencies.
+    """
+    state = {'errors': 0, 'consecutive_errors': 0, 'error_messages': [], 'stop': False,
+             'request_latencies': []}
+
+    #Preallocated result columns, filled by index as chunks complete
+    n = len(prepared)
+    out = {
+        'fraud_score': np.empty(n, dtype=np.float64),
+        'decision': np.empty(n, dtype='U8'),
+        'latency_ms': np.empty(n, dtype=np.float64),
+        'ok': np.zeros(n, dtype=bool)
+    }
+
+    #One keep-alive connection pool shared by all in-flight requests, sized to the concurrency cap
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency,
+                          keepalive_expiry=KEEPALIVE_EXPIRY_S)
+    transport = httpx.AsyncHTTPTransport(http2=True, limits=limits, socket_options=SOCKET_OPTIONS)
+    sem = asyncio.Semaphore(concurrency)
+
+    start_time = time.perf_counter()
+    with tqdm(total=n, disable=not show_progress, miniters=200, mininterval=0.25) as pbar:
+        #trust_env=False: no proxy/netrc environment lookups for a local API
+        async with httpx.AsyncClient(transport=transport, timeout=10.0, headers=CLIENT_HEADERS,
+                                     trust_env=False) as client:
+            scheduler = BatchScheduler(
+                lambda start, batch: _score_batch(sem, client, batch, start, out, state, pbar),
+                max_size=batch_size,
+                max_wait_ms=max_wait_ms
+            )
+
+            for i, transaction in enumerate(prepared):
+                if state['stop']:
+                    break
+                if arrival_rate:
+                    #Sleep until this transaction's scheduled arrival
+                    delay = start_time + i / arrival_rate - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                scheduler.submit(transaction)
+
+            await scheduler.drain()
+
+    return out, state
+
+
+#Payloads published to forked workers: set before the pool forks, so children read them from
+#inherited memory and only (lo, hi) index ranges are pickled per task
+_FORK_PAYLOADS = None
+
+
+def _score_records_worker(lo, hi, payloads, concurrency, batch_size, max_wait_ms, arrival_rate):
     """
-    Score transactions through API with rate limiting and error handling
+    Worker process entry point: own event loop and connection pool
+
+    Scores payloads[lo:hi]; payloads is None under fork, where the inherited _FORK_PAYLOADS is used.
+    """
+    if payloads is None:
+        payloads = _FORK_PAYLOADS
+    return asyncio.run(_score_records(payloads[lo:hi], concurrency, batch_size, max_wait_ms, arrival_rate,
+                                      show_progress=False))
+
+
+async def score_through_api(test_df, sample_size=None, show_progress=True,
+                            concurrency=MAX_CONCURRENCY, batch_size=BATCH_SIZE,
+                            max_wait_ms=BATCH_MAX_WAIT_MS, arrival_rate=None, workers=1):
+    """
+    Score transactions through API concurrently with error handling
+
+    Transactions go through a BatchScheduler into /batch_score requests of up
+    to `batch_size`, with up to `concurrency` requests in flight over a single
+    pooled httpx client. arrival_rate (transactions/second) paces submissions
+    to replay the dataset as a live stream; None submits everything at once.
+    With workers > 1 the payloads are split into contiguous slices scored by
+    separate processes, each with its own client, so JSON work is not bound
+    to one GIL.
     """
     print("\nSCORING THROUGH API")
-    
+
     #Sample if requested
     if sample_size:
         test_df = test_df.sample(min(sample_size, len(test_df)), random_state=42)
         print(f"Sampling {len(test_df):,} transactions for testing")
     else:
         print(f"Scoring all {len(test_df):,} transactions")
-    
-    results = []
-    latencies = []
-    errors = 0
-    error_messages = []
-    consecutive_errors = 0
-    max_consecutive_errors = 10
-    
+
+    #The server rejects batches above its own limit
+    batch_size = max(1, min(batch_size, BATCH_SIZE))
+
     print("\nProcessing transactions...")
-    
-    #Create session for connection pooling
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(
-        pool_connections=10,
-        pool_maxsize=10,
-        max_retries=3
-    )
-    session.mount('http://', adapter)
-    
-    iterator = tqdm(test_df.iterrows(), total=len(test_df), disable=not show_progress)
-    
-    for idx, row in iterator:
-        transaction = prepare_transaction_for_api(row)
-        
-        #Measure latency
-        start_time = time.time()
-        
+
+    prepared = prepare_transactions_for_api(test_df)
+
+    wall_start = time.perf_counter()
+    if workers > 1:
+        global _FORK_PAYLOADS
+        #fork: children inherit _FORK_PAYLOADS and receive only index ranges;
+        #other start methods (spawn) need each slice pickled into its task
+        use_fork = 'fork' in mp.get_all_start_methods()
+        mp_context = mp.get_context('fork') if use_fork else None
+        bounds = np.linspace(0, len(prepared), workers + 1).astype(int)
+        worker_rate = arrival_rate / workers if arrival_rate else None
+
+        loop = asyncio.get_running_loop()
+        _FORK_PAYLOADS = prepared if use_fork else None
         try:
-            response = session.post(
-                API_URL,
-                json=transaction,
-                timeout=10
-            )
-            
-            latency_ms = (time.time() - start_time) * 1000
-            
-            if response.status_code == 200:
-                prediction = response.json()
-                
-                results.append({
-                    'true_label': int(row['is_fraud']),
-                    'fraud_score': prediction.get('fraud_score', prediction.get('fraud_probability', 0)),
-                    'decision': prediction.get('decision', 'UNKNOWN'),
-                    'latency_ms': latency_ms
-                })
-                
-                latencies.append(latency_ms)
-                consecutive_errors = 0  #Reset on success
-                
-            else:
-                errors += 1
-                consecutive_errors += 1
-                error_msg = f"Status {response.status_code}: {response.text[:100]}"
-                if errors <= 3:  
-                    print(f"\n{error_msg}")
-                if errors == 1:
-                    error_messages.append(error_msg)
-                
-        except requests.exceptions.ConnectionError as e:
-            errors += 1
-            consecutive_errors += 1
-            error_msg = f"Connection failed: {str(e)[:100]}"
-            if errors <= 3:
-                print(f"\n{error_msg}")
-            if errors == 1:
-                error_messages.append(error_msg)
-            
-            #Stop if API server has crashed
-            if consecutive_errors >= max_consecutive_errors:
-                print(f"\nToo many consecutive errors ({consecutive_errors})!")
-                print("API server may have crashed. Stopping early.")
-                print(f"Successfully processed: {len(results):,} transactions")
-                break
-                
-        except Exception as e:
-            errors += 1
-            consecutive_errors += 1
-            error_msg = f"Request failed: {str(e)[:100]}"
-            if errors <= 3:
-                print(f"\n{error_msg}")
-            if errors == 1:
-                error_messages.append(error_msg)
-        
-        #Rate limiting: pause every 100 requests
-        if (len(results) + errors) % 100 == 0:
-            time.sleep(0.05)  #50ms pause
-        
-        #Longer pause every 1000 requests
-        if (len(results) + errors) % 1000 == 0 and (len(results) + errors) < len(test_df):
-            time.sleep(0.5)  #500ms pause
-    
-    #Close session
-    session.close()
-    
-    results_df = pd.DataFrame(results)
-    
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+                parts = await asyncio.gather(*[
+                    loop.run_in_executor(pool, _score_records_worker,
+                                         *((lo, hi, None) if use_fork else (0, hi - lo, prepared[lo:hi])),
+                                         max(1, concurrency // workers), batch_size, max_wait_ms, worker_rate)
+                    for lo, hi in zip(bounds[:-1], bounds[1:])
+                ])
+        finally:
+            _FORK_PAYLOADS = None
+
+        out = {key: np.concatenate([part_out[key] for part_out, _ in parts]) for key in parts[0][0]}
+        state = {
+            'errors': sum(part_state['errors'] for _, part_state in parts),
+            'error_messages': [m for _, part_state in parts for m in part_state['error_messages']],
+            'stop': any(part_state['stop'] for _, part_state in parts),
+            'request_latencies': [l for _, part_state in parts for l in part_state['request_latencies']]
+        }
+    else:
+        out, state = await _score_records(prepared, concurrency, batch_size, max_wait_ms,
+                                          arrival_rate, show_progress)
+    wall_time = time.perf_counter() - wall_start
+
+    #Input order is kept, so results line up with test_df rows
+    ok = out['ok']
+    results_df = pd.DataFrame({
+        'row': test_df.index.to_numpy()[ok],
+        'true_label': test_df['is_fraud'].to_numpy(dtype=np.int8)[ok],
+        'fraud_score': out['fraud_score'][ok],
+        'decision': out['decision'][ok],
+        'latency_ms': out['latency_ms'][ok]
+    })
+    latencies = results_df['latency_ms'].tolist()
+    errors = state['errors']
+    error_messages = state['error_messages']
+
+    if state['stop']:
+        print(f"Successfully processed: {len(results_df):,} transactions")
+
     print("\nLATENCY STATISTICS")
     print(f"Total requests:   {len(results_df):,}")
     print(f"Failed requests:  {errors:,}")
-    
+    if state['request_latencies']:
+        print(f"Batch requests:   {len(state['request_latencies']):,} "
+              f"(max size {batch_size}, mean round trip {np.mean(state['request_latencies']):.2f} ms)")
+
     if len(results_df) > 0:
         print(f"Success rate:     {len(results_df)/(len(results_df)+errors)*100:.1f}%")
     else:
         print(f"Success rate:     0.0%")
-    
+
     if len(latencies) > 0:
-        print(f"\nLatency Distribution:")
-        print(f"  Mean:     {np.mean(latencies):>8.2f} ms")
-        print(f"  Median:   {np.median(latencies):>8.2f} ms")
-        print(f"  Std Dev:  {np.std(latencies):>8.2f} ms")
-        print(f"  Min:      {np.min(latencies):>8.2f} ms")
-        print(f"  Max:      {np.max(latencies):>8.2f} ms")
-        print(f"  P50:      {np.percentile(latencies, 50):>8.2f} ms")
-        print(f"  P95:      {np.percentile(latencies, 95):>8.2f} ms")
-        print(f"  P99:      {np.percentile(latencies, 99):>8.2f} ms")
-        
-        #Throughput
-        total_time = sum(latencies) / 1000  
-        throughput = len(latencies) / total_time if total_time > 0 else 0
-        print(f"\nThroughput:       {throughput:.1f} requests/second")
-    
+        stats = latency_stats(latencies)
+        print(f"\nLatency Distribution (per transaction, amortized over batch):")
+        print(f"  Mean:     {stats['mean_ms']:>8.2f} ms")
+        print(f"  Median:   {stats['median_ms']:>8.2f} ms")
+        print(f"  Std Dev:  {stats['std_ms']:>8.2f} ms")
+        print(f"  Min:      {stats['min_ms']:>8.2f} ms")
+        print(f"  Max:      {stats['max_ms']:>8.2f} ms")
+        print(f"  P50:      {stats['p50_ms']:>8.2f} ms")
+        print(f"  P95:      {stats['p95_ms']:>8.2f} ms")
+        print(f"  P99:      {stats['p99_ms']:>8.2f} ms")
+
+        #Throughput (wall clock - requests overlap)
+        throughput = len(latencies) / wall_time if wall_time > 0 else 0
+        print(f"\nThroughput:       {throughput:.1f} transactions/second")
+
     if errors > 0 and error_messages:
         print(f"\nFirst error: {error_messages[0]}")
-    
-    return results_df, latencies, errors
 
+    return results_df, latencies, errors, wall_time
 
-def compare_with_offline_model(results_df, test_df, model):
+
+def compare_with_offline_model(results_df, test_df, model, feature_columns=None):
     """
     Compare API predictions with offline model predictions
+
+    feature_columns can be computed once by the caller and reused across calls.
     """
     
     print("\nCOMPARING API vs OFFLINE MODEL PREDICTIONS")
     
     #Get ONLY feature columns (those starting with 'feat_')
-    feature_columns = [col for col in test_df.columns if col.startswith('feat_')]
+    if feature_columns is None:
+        feature_columns = [col for col in test_df.columns if col.startswith('feat_')]
     
-    X_test = test_df[feature_columns].head(len(results_df))
-    X_test = X_test.fillna(0).replace([np.inf, -np.inf], 0)
+    #One contiguous float64 matrix for the scored rows (float32 could flip tree splits)
+    positions = test_df.index.get_indexer(results_df['row'])
+    X_test = np.ascontiguousarray(test_df[feature_columns].to_numpy(dtype=np.float64)[positions])
+    np.nan_to_num(X_test, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
     
     #Get offline predictions
-    offline_scores = model.predict(X_test)
+    offline_scores = model.predict(X_test, num_threads=os.cpu_count())
     
     api_scores = results_df['fraud_score'].values
     
@@ -296,6 +540,33 @@ def compare_with_offline_model(results_df, test_df, model):
     return differences
 
 
+def confusion_counts(y_true, y_score, thresholds):
+    """
+    (tn, fp, fn, tp) for `y_score >= threshold` at every threshold
+
+    Sorts scores once and reads each confusion matrix off cumulative label
+    counts, instead of one confusion_matrix pass per threshold.
+    """
+    y_true = np.asarray(y_true).astype(np.int64)
+    y_score = np.asarray(y_score)
+
+    order = np.argsort(y_score, kind='stable')
+    scores_sorted = y_score[order]
+    positives_below = np.concatenate(([0], np.cumsum(y_true[order])))
+
+    n = len(y_true)
+    n_pos = int(positives_below[-1])
+
+    #Rows before idx score below the threshold
+    idx = np.searchsorted(scores_sorted, np.asarray(thresholds, dtype=np.float64), side='left')
+    tp = n_pos - positives_below[idx]
+    fp = (n - idx) - tp
+    fn = n_pos - tp
+    tn = (n - n_pos) - fp
+
+    return np.stack([tn, fp, fn, tp], axis=1)
+
+
 def calculate_fraud_metrics(results_df):
     """
     Calculate fraud detection metrics from API predictions
@@ -304,7 +575,6 @@ def calculate_fraud_metrics(results_df):
     print("\nFRAUD DETECTION METRICS (Multiple Thresholds)")
     
     from sklearn.metrics import (
-        confusion_matrix, 
         roc_auc_score,
         average_precision_score
     )
@@ -327,17 +597,17 @@ def calculate_fraud_metrics(results_df):
         print("Could not calculate AUC/AP (need both classes)")
     
     #Test multiple thresholds
-    thresholds_to_test = [0.5, 0.665, 0.8, 0.9, 0.95, 0.99]
+    #Production thresholds are part of the sweep, so the summary below is a lookup
+    thresholds_to_test = sorted({0.5, REVIEW_THRESHOLD, 0.8, 0.9, BLOCK_THRESHOLD, 0.99})
     
     print(f"\n{'Threshold':<12} {'Precision':<12} {'Recall':<12} {'F1':<12} {'Approval %':<12}")
     
     metrics_by_threshold = {}
     
-    for threshold in thresholds_to_test:
-        y_pred = (y_score >= threshold).astype(int)
-        
-        tn, fp, fn, tp = confusion_matrix(y_true, y_pred).ravel()
-        
+    #One sort shared by every threshold
+    counts = confusion_counts(y_true, y_score, thresholds_to_test)
+    
+    for threshold, (tn, fp, fn, tp) in zip(thresholds_to_test, counts):
         precision = tp / (tp + fp) if (tp + fp) > 0 else 0
         recall = tp / (tp + fn) if (tp + fn) > 0 else 0
         f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
@@ -359,13 +629,9 @@ def calculate_fraud_metrics(results_df):
     #Production threshold (0.95)
     print(f"PRODUCTION THRESHOLD ({BLOCK_THRESHOLD})")
     
-    y_pred_prod = (y_score >= BLOCK_THRESHOLD).astype(int)
-    tn, fp, fn, tp = confusion_matrix(y_true, y_pred_prod).ravel()
-    
-    precision = tp / (tp + fp) if (tp + fp) > 0 else 0
-    recall = tp / (tp + fn) if (tp + fn) > 0 else 0
-    f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-    approval_rate = (tn + fn) / (tn + fp + fn + tp)
+    prod = metrics_by_threshold[BLOCK_THRESHOLD]
+    tp, fp, tn, fn = prod['tp'], prod['fp'], prod['tn'], prod['fn']
+    precision, recall, f1, approval_rate = prod['precision'], prod['recall'], prod['f1'], prod['approval_rate']
     
     print(f"Confusion Matrix:")
     print(f"  True Positives (Caught Fraud):     {tp:>6,}")
@@ -390,8 +656,13 @@ def calculate_fraud_metrics(results_df):
     return metrics_by_threshold
 
 
-def save_results(results_df, latencies, metrics, differences, errors):
-    """Save all results to files"""
+def save_results(results_df, latencies, metrics, differences, errors, wall_time):
+    """
+    Save all results to files
+
+    wall_time is the measured scoring duration in seconds; throughput is computed
+    from it, since per-transaction latencies overlap across concurrent requests.
+    """
     
     print("SAVING RESULTS")
     
@@ -403,6 +674,8 @@ def save_results(results_df, latencies, metrics, differences, errors):
     results_df.to_csv(results_file, index=False)
     print(f"Saved predictions to: {results_file}")
     
+    stats = latency_stats(latencies) if latencies else {}
+
     summary = {
         'test_info': {
             'total_transactions': len(results_df),
@@ -412,15 +685,15 @@ def save_results(results_df, latencies, metrics, differences, errors):
             'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
         },
         'latency_stats': {
-            'mean_ms': float(np.mean(latencies)) if latencies else None,
-            'median_ms': float(np.median(latencies)) if latencies else None,
-            'std_ms': float(np.std(latencies)) if latencies else None,
-            'min_ms': float(np.min(latencies)) if latencies else None,
-            'max_ms': float(np.max(latencies)) if latencies else None,
-            'p50_ms': float(np.percentile(latencies, 50)) if latencies else None,
-            'p95_ms': float(np.percentile(latencies, 95)) if latencies else None,
-            'p99_ms': float(np.percentile(latencies, 99)) if latencies else None,
-            'throughput_per_sec': float(len(latencies) / (sum(latencies) / 1000)) if latencies and sum(latencies) > 0 else None
+            'mean_ms': stats.get('mean_ms'),
+            'median_ms': stats.get('median_ms'),
+            'std_ms': stats.get('std_ms'),
+            'min_ms': stats.get('min_ms'),
+            'max_ms': stats.get('max_ms'),
+            'p50_ms': stats.get('p50_ms'),
+            'p95_ms': stats.get('p95_ms'),
+            'p99_ms': stats.get('p99_ms'),
+            'throughput_per_sec': float(len(latencies) / wall_time) if latencies and wall_time > 0 else None
         },
         'model_comparison': {
             'mean_difference': float(np.mean(differences)),
@@ -455,6 +728,23 @@ def save_results(results_df, latencies, metrics, differences, errors):
 
 def main():
     """Main execution"""
+
+    parser = argparse.ArgumentParser(description="Validate API predictions on the test dataset")
+    parser.add_argument('--sample-size', type=int, default=None,
+                        help="Score a random sample of this many transactions (default: full test set)")
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY,
+                        help="Maximum /batch_score requests in flight")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Client processes sharing the work (concurrency is split between them)")
+    parser.add_argument('--interactive', action='store_true',
+                        help="Prompt for the test size instead of using --sample-size")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"Transactions per /batch_score request (max {BATCH_SIZE})")
+    parser.add_argument('--arrival-rate', type=float, default=None,
+                        help="Replay transactions at this rate (per second) instead of all at once")
+    parser.add_argument('--max-wait-ms', type=float, default=BATCH_MAX_WAIT_MS,
+                        help="Flush a partial batch once its oldest transaction has waited this long")
+    args = parser.parse_args()
     
     print("\nAPI VALIDATION ON FULL TEST DATASET")
     
@@ -465,25 +755,35 @@ def main():
     #Load data and model
     test_df = load_test_data()
     model = load_offline_model()
-    
-    print("\nTEST SIZE SELECTION")
-    print("Options:")
-    print("  1. Quick test (1,000 transactions) - ~2-3 seconds")
-    print("  2. Medium test (5,000 transactions) - ~10-15 seconds")
-    print("  3. Full test (all transactions) - may take 1-2 minutes")
-    print()
-    
-    choice = input("Enter choice (1/2/3) or press Enter for full test: ").strip()
-    
-    if choice == '1':
-        sample_size = 1000
-    elif choice == '2':
-        sample_size = 5000
-    else:
-        sample_size = None  #Full dataset
+
+    #Model's own feature order, resolved once
+    feature_columns = model.feature_name()
+    
+    sample_size = args.sample_size
+    if args.interactive:
+        print("\nTEST SIZE SELECTION")
+        print("Options:")
+        print("  1. Quick test (1,000 transactions) - ~2-3 seconds")
+        print("  2. Medium test (5,000 transactions) - ~10-15 seconds")
+        print("  3. Full test (all transactions) - may take 1-2 minutes")
+        print()
+        
+        choice = input("Enter choice (1/2/3) or press Enter for full test: ").strip()
+        
+        if choice == '1':
+            sample_size = 1000
+        elif choice == '2':
+            sample_size = 5000
+        else:
+            sample_size = None  #Full dataset
     
     #Score through API
-    results_df, latencies, errors = score_through_api(test_df, sample_size=sample_size)
+    results_df, latencies, errors, wall_time = asyncio.run(
+        score_through_api(test_df, sample_size=sample_size,
+                          concurrency=args.concurrency, batch_size=args.batch_size,
+                          max_wait_ms=args.max_wait_ms, arrival_rate=args.arrival_rate,
+                          workers=args.workers)
+    )
     
     if len(results_df) == 0:
         print("\nNo successful predictions! Please check API logs.")
@@ -494,20 +794,21 @@ def main():
         sys.exit(1)
     
     #Compare with offline model
-    differences = compare_with_offline_model(results_df, test_df, model)
+    differences = compare_with_offline_model(results_df, test_df, model, feature_columns=feature_columns)
     
     #Calculate metrics
     metrics = calculate_fraud_metrics(results_df)
     
     #Save results
-    save_results(results_df, latencies, metrics, differences, errors)
+    save_results(results_df, latencies, metrics, differences, errors, wall_time)
     
     #Final summary
     print("\nAPI VALIDATION COMPLETE")
     print(f"Scored {len(results_df):,} transactions")
     if latencies:
-        print(f"Average latency: {np.mean(latencies):.2f}ms")
-        print(f"P95 latency: {np.percentile(latencies, 95):.2f}ms")
+        stats = latency_stats(latencies)
+        print(f"Average latency: {stats['mean_ms']:.2f}ms")
+        print(f"P95 latency: {stats['p95_ms']:.2f}ms")
     print(f"API predictions {'match' if np.max(differences) < 0.001 else 'differ from'} offline model")
     
     fraud_rate = results_df['true_label'].mean() * 100
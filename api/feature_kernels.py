@@ -0,0 +1,152 @@
+"""
+Compiled feature kernels for real-time scoring
+Numba-compiled scalar feature math that writes straight into the model row buffer
+"""
+
+import threading
+import numpy as np
+from numba import njit, prange, float64, int64, void
+
+#Output order of fill_features; map onto model slots with feature_slots()
+KERNEL_FEATURES = (
+    #Temporal
+    'feat_hour',
+    'feat_day_of_week',
+    'feat_is_weekend',
+    'feat_is_night',
+    'feat_hour_sin',
+    'feat_hour_cos',
+    'feat_day_sin',
+    'feat_day_cos',
+    #Amount
+    'feat_is_small_amount',
+    'feat_is_large_amount',
+    'feat_amount_vs_user_avg',
+    'feat_amount_vs_merchant_avg',
+    'feat_amount_percentile_user',
+    #Geo
+    'feat_is_high_risk_country',
+    'feat_country_change',
+    'feat_unique_countries_user_7d',
+    'feat_user_country_entropy',
+    #Velocity
+    'feat_tx_count_user_1h',
+    'feat_tx_count_user_24h',
+    'feat_amount_sum_user_24h',
+    'feat_amount_avg_user_24h',
+    'feat_time_since_last_tx_mins',
+    'feat_tx_count_merchant_1h',
+    #Device/IP risk
+    'feat_unique_users_per_device_24h',
+    'feat_unique_countries_per_device_7d',
+    'feat_unique_users_per_ip_24h',
+    'feat_device_age_days',
+    'feat_ip_age_days',
+    #Historical risk
+    'feat_user_fraud_rate_historical',
+    'feat_merchant_fraud_rate_historical',
+    'feat_device_fraud_rate_historical',
+)
+
+#Number of scalar inputs taken by fill_features after (out, slots)
+N_KERNEL_INPUTS = 24
+
+#Cyclical encodings for every hour/weekday (frozen into the compiled kernels as constants)
+_HOUR_SIN = np.sin(2 * np.pi * np.arange(24) / 24)
+_HOUR_COS = np.cos(2 * np.pi * np.arange(24) / 24)
+_DAY_SIN = np.sin(2 * np.pi * np.arange(7) / 7)
+_DAY_COS = np.cos(2 * np.pi * np.arange(7) / 7)
+
+
+def feature_slots(feature_index: dict, spill_slot: int) -> np.ndarray:
+    """Row slot for each kernel output (spill_slot for features the model does not use)"""
+    return np.array([feature_index.get(name, spill_slot) for name in KERNEL_FEATURES], dtype=np.int64)
+
+
+#Explicit signature: compiled eagerly at import (no first-request JIT) and ints coerce to float64
+@njit(void(float64[::1], int64[::1], *([float64] * N_KERNEL_INPUTS)), cache=True, fastmath=True)
+def fill_features(out, slots,
+                  hour, day_of_week, amount,
+                  user_avg, user_std, merchant_avg, merchant_std,
+                  is_high_risk_country, country_change, user_country_count,
+                  tx_count_user_1h, tx_count_user_24h, amount_sum_user_24h, amount_avg_user_24h,
+                  time_since_last_tx, tx_count_merchant_1h,
+                  device_user_count, device_country_count, ip_user_count,
+                  device_age, ip_age,
+                  user_fraud_rate, merchant_fraud_rate, device_fraud_rate):
+    """Compute every feature for one transaction and write it to out[slots[k]]"""
+
+    #Temporal
+    out[slots[0]] = hour
+    out[slots[1]] = day_of_week
+    out[slots[2]] = 1.0 if day_of_week >= 5 else 0.0
+    out[slots[3]] = 1.0 if 0 <= hour < 6 else 0.0
+
+    #Cyclical encoding (table lookups)
+    h = int(hour)
+    d = int(day_of_week)
+    out[slots[4]] = _HOUR_SIN[h]
+    out[slots[5]] = _HOUR_COS[h]
+    out[slots[6]] = _DAY_SIN[d]
+    out[slots[7]] = _DAY_COS[d]
+
+    #Amount
+    out[slots[8]] = 1.0 if amount < 10 else 0.0
+    out[slots[9]] = 1.0 if amount > 500 else 0.0
+    out[slots[10]] = (amount - user_avg) / (user_std + 1)
+    out[slots[11]] = (amount - merchant_avg) / (merchant_std + 1)
+    out[slots[12]] = min(amount / 1000, 1.0)
+
+    #Geo
+    out[slots[13]] = is_high_risk_country
+    out[slots[14]] = country_change
+    out[slots[15]] = user_country_count
+    out[slots[16]] = 0.0  #Simplified for production
+
+    #Velocity
+    out[slots[17]] = tx_count_user_1h
+    out[slots[18]] = tx_count_user_24h
+    out[slots[19]] = amount_sum_user_24h
+    out[slots[20]] = amount_avg_user_24h
+    out[slots[21]] = time_since_last_tx
+    out[slots[22]] = tx_count_merchant_1h
+
+    #Device/IP risk
+    out[slots[23]] = device_user_count
+    out[slots[24]] = device_country_count
+    out[slots[25]] = ip_user_count
+    out[slots[26]] = device_age
+    out[slots[27]] = ip_age
+
+    #Historical risk
+    out[slots[28]] = user_fraud_rate
+    out[slots[29]] = merchant_fraud_rate
+    out[slots[30]] = device_fraud_rate
+
+
+@njit(void(float64[:, ::1], int64[::1], float64[:, ::1]), parallel=True, cache=True)
+def _fill_matrix(X, slots, inputs):
+    for i in prange(X.shape[0]):
+        fill_features(X[i], slots,
+                      inputs[i, 0], inputs[i, 1], inputs[i, 2],
+                      inputs[i, 3], inputs[i, 4], inputs[i, 5], inputs[i, 6],
+                      inputs[i, 7], inputs[i, 8], inputs[i, 9],
+                      inputs[i, 10], inputs[i, 11], inputs[i, 12], inputs[i, 13],
+                      inputs[i, 14], inputs[i, 15],
+                      inputs[i, 16], inputs[i, 17], inputs[i, 18],
+                      inputs[i, 19], inputs[i, 20],
+                      inputs[i, 21], inputs[i, 22], inputs[i, 23])
+
+
+#Numba's default workqueue threading layer aborts on concurrent parallel launches
+_fill_matrix_lock = threading.Lock()
+
+
+def fill_matrix(X: np.ndarray, slots: np.ndarray, inputs: np.ndarray) -> None:
+    """
+    Fill every row of X from an (N, N_KERNEL_INPUTS) input matrix, rows in parallel
+
+    Same per-row math as fill_features; calls are serialized across request threads.
+    """
+    with _fill_matrix_lock:
+        _fill_matrix(X, slots, inputs)
@@ -2,18 +2,34 @@
 Python client for testing Fraud Detection API
 """
 
-import requests
+import atexit
+import httpx
 import json
+import socket
 import time
 from typing import Dict, Any
 
-API_URL = "http://localhost:8000"
+#Loopback IP skips name resolution on every new connection
+API_URL = "http://127.0.0.1:8000"
+
+#One pooled session for every call, so tests measure the server rather than TCP handshakes
+_SESSION = httpx.Client(
+    transport=httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=32, keepalive_expiry=30.0),
+        socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]  #No Nagle delay on small bodies
+    ),
+    headers={'Connection': 'keep-alive', 'Accept-Encoding': 'identity'},
+    timeout=10.0,
+    trust_env=False  #No proxy/netrc environment lookups for a local API
+)
+atexit.register(_SESSION.close)
 
 def test_health():
     """Test health endpoint"""
     print("\nHEALTH CHECK")
 
-    response = requests.get(f"{API_URL}/health")
+    response = _SESSION.get(f"{API_URL}/health")
     print(json.dumps(response.json(), indent=2))
     assert response.status_code == 200
 
@@ -21,13 +37,13 @@ def test_model_info():
     """Test model info endpoint"""
     print("\nMODEL INFO")
 
-    response = requests.get(f"{API_URL}/model/info")
+    response = _SESSION.get(f"{API_URL}/model/info")
     print(json.dumps(response.json(), indent=2))
     assert response.status_code == 200
 
 def score_transaction(transaction: Dict[str, Any]) -> Dict[str, Any]:
     """Score a single transaction"""
-    response = requests.post(
+    response = _SESSION.post(
         f"{API_URL}/score",
         json=transaction
     )
@@ -101,9 +117,10 @@ def test_latency():
     for i in range(100):
         transaction['transaction_id'] = f"txn_latency_{i}"
 
-        start = time.time()
+        #Monotonic, integer-ns clock: immune to wall-clock adjustments
+        start_ns = time.perf_counter_ns()
         result = score_transaction(transaction)
-        latency_ms = (time.time() - start) * 1000
+        latency_ms = (time.perf_counter_ns() - start_ns) / 1e6
 
         latencies.append(latency_ms)
 
@@ -139,7 +156,7 @@ def test_batch_scoring():
         for i in range(10)
     ]
 
-    response = requests.post(f"{API_URL}/batch_score", json=transactions)
+    response = _SESSION.post(f"{API_URL}/batch_score", json=transactions)
     result = response.json()
 
     print(f"Scored {result['total']} transactions")
@@ -4,12 +4,575 @@ Feature Engineering for Payment Fraud Detection
 CRITICAL: All features are calculated using ONLY past information to prevent leakage.
 """
 
+import bisect
 import pandas as pd
 import numpy as np
 from datetime import timedelta
 import warnings
+from dataclasses import dataclass
 warnings.filterwarnings('ignore')
 
+try:
+    from numba import njit, prange, types
+    from numba.typed import Dict
+    NUMBA_AVAILABLE = True
+except ImportError:
+    prange = range
+    NUMBA_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+
+NS_PER_HOUR = 3600 * 10**9
+
+#Output widths: 0/1 flags as uint8, every other feature as float32 (ample for tree models)
+FEATURE_DTYPE = np.float32
+FLAG_FEATURES = frozenset({
+    'feat_is_weekend', 'feat_is_night', 'feat_is_small_amount', 'feat_is_large_amount',
+    'feat_is_high_risk_country', 'feat_country_change',
+})
+
+#Cyclical encodings for every hour/weekday (same tables as api/feature_kernels.py)
+HOUR_SIN = np.sin(2 * np.pi * np.arange(24) / 24)
+HOUR_COS = np.cos(2 * np.pi * np.arange(24) / 24)
+DAY_SIN = np.sin(2 * np.pi * np.arange(7) / 7)
+DAY_COS = np.cos(2 * np.pi * np.arange(7) / 7)
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def rolling_unique_counts(times_ns, values, window_ns):
+        """
+        Unique values in [t - window, t) for each row of one time-sorted group
+
+        Rows sharing the current timestamp are excluded, like the current row itself.
+        Single pass: a left cursor evicts expired rows, a right cursor admits
+        strictly earlier rows, and the live multiset is a value -> count dict.
+        """
+        n = len(times_ns)
+        out = np.empty(n, dtype=np.int64)
+        counts = Dict.empty(key_type=types.int64, value_type=types.int64)
+        left = 0
+        right = 0
+
+        for i in range(n):
+            t = times_ns[i]
+
+            #Admit rows strictly before the current timestamp
+            while right < n and times_ns[right] < t:
+                v = values[right]
+                counts[v] = counts.get(v, 0) + 1
+                right += 1
+
+            #Evict rows older than the window start
+            while left < right and times_ns[left] < t - window_ns:
+                v = values[left]
+                c = counts[v] - 1
+                if c == 0:
+                    del counts[v]
+                else:
+                    counts[v] = c
+                left += 1
+
+            out[i] = len(counts)
+
+        return out
+
+else:
+    def rolling_unique_counts(times_ns, values, window_ns):
+        """
+        NumPy fallback for rolling_unique_counts when numba is not installed
+
+        Window bounds for every row come from two searchsorted calls; a bincount
+        multiset over group-local codes is only updated when the bounds move.
+        """
+        n = len(times_ns)
+        out = np.empty(n, dtype=np.int64)
+        starts = np.searchsorted(times_ns, times_ns - window_ns, side='left')
+        ends = np.searchsorted(times_ns, times_ns, side='left')  #Excludes the current timestamp
+
+        codes = np.unique(values, return_inverse=True)[1]
+        counts = np.zeros(n, dtype=np.int64)
+        left = right = 0
+        distinct = 0
+
+        for i in range(n):
+            if starts[i] != left or ends[i] != right:
+                np.add.at(counts, codes[right:ends[i]], 1)
+                np.subtract.at(counts, codes[left:starts[i]], 1)
+                left, right = starts[i], ends[i]
+                distinct = np.count_nonzero(counts)
+            out[i] = distinct
+
+        return out
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def expanding_prev_rank_pct(codes):
+        """
+        Average-rank percentile of the previous row among all rows up to it, for one group
+
+        codes are group-local dense value ranks (0..k-1). Matches
+        expanding().apply(pd.Series(y[:-1]).rank(pct=True).iloc[-1]); the first row is 0.5.
+        A Fenwick tree over the codes gives counts below / at a value in O(log k).
+        """
+        n = len(codes)
+        out = np.empty(n, dtype=np.float64)
+        if n == 0:
+            return out
+        k = codes.max() + 1
+        tree = np.zeros(k + 1, dtype=np.int64)
+        out[0] = 0.5
+
+        for i in range(1, n):
+            v = codes[i - 1]
+
+            #Insert the previous row
+            j = v + 1
+            while j <= k:
+                tree[j] += 1
+                j += j & -j
+
+            #Rows strictly below v, then rows at or below v
+            less = 0
+            j = v
+            while j > 0:
+                less += tree[j]
+                j -= j & -j
+            less_equal = 0
+            j = v + 1
+            while j > 0:
+                less_equal += tree[j]
+                j -= j & -j
+
+            out[i] = (less + less_equal + 1) / (2.0 * i)
+
+        return out
+
+else:
+    def expanding_prev_rank_pct(codes):
+        """Pure-Python fallback for expanding_prev_rank_pct: bisect into a sorted list of previous codes"""
+        n = len(codes)
+        out = np.empty(n, dtype=np.float64)
+        seen = []
+        for i in range(n):
+            if i == 0:
+                out[i] = 0.5
+                continue
+            v = codes[i - 1]
+            bisect.insort(seen, v)
+            less = bisect.bisect_left(seen, v)
+            less_equal = bisect.bisect_right(seen, v)
+            out[i] = (less + less_equal + 1) / (2.0 * i)
+        return out
+
+
+def group_dense_ranks(group_codes, values):
+    """Dense rank (0..k-1) of each value within its group"""
+    order = np.lexsort((values, group_codes))
+    g = group_codes[order]
+    v = values[order]
+    new_group = np.r_[True, g[1:] != g[:-1]]
+    new_value = new_group | np.r_[True, v[1:] != v[:-1]]
+    dense = np.cumsum(new_value) - 1
+    group_base = np.maximum.accumulate(np.where(new_group, dense, 0))
+
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[order] = dense - group_base
+    return ranks
+
+
+def grouped_expanding_rank_pct(group_codes, values):
+    """Per-group expanding_prev_rank_pct of values"""
+    order, starts, ends = group_bounds(group_codes)
+    out = np.empty(len(values), dtype=np.float64)
+    _rank_pct_by_group(order, starts, ends, group_dense_ranks(group_codes, values), out)
+    return out
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def welford_zscore(values):
+        """
+        (x - mean of previous rows) / (std of previous rows + 1) for one group, single pass
+
+        Welford running mean/M2; rows with fewer than two predecessors get 0.
+        """
+        n = len(values)
+        out = np.empty(n, dtype=np.float64)
+        count = 0
+        mean = 0.0
+        m2 = 0.0
+
+        for i in range(n):
+            x = values[i]
+            if count < 2:
+                out[i] = 0.0
+            else:
+                out[i] = (x - mean) / (np.sqrt(m2 / (count - 1)) + 1)
+
+            count += 1
+            delta = x - mean
+            mean += delta / count
+            m2 += delta * (x - mean)
+
+        return out
+
+
+def grouped_zscore(group_codes, values):
+    """Per-group welford_zscore of values"""
+    order, starts, ends = group_bounds(group_codes)
+    out = np.empty(len(values), dtype=np.float64)
+    if NUMBA_AVAILABLE:
+        _zscore_by_group(order, starts, ends, values, out)
+        return out
+
+    #Without numba: one Cython groupby-expanding scan; sorted keys emit rows in `order`,
+    #so the previous row's stats are a shift by one, reset at each group start
+    expanding = pd.Series(values).groupby(group_codes).expanding()
+    prev_mean = np.roll(expanding.mean().to_numpy(), 1)
+    prev_std = np.roll(expanding.std().to_numpy(), 1)
+    z = (values[order] - prev_mean) / (prev_std + 1)
+    z[starts[starts < ends]] = np.nan
+    out[order] = np.nan_to_num(z, nan=0.0)
+    return out
+
+
+def xlog2x(x):
+    """x * log2(x) with 0 * log2(0) = 0"""
+    x = np.asarray(x, dtype=np.float64)
+    return np.where(x > 0, x * np.log2(np.maximum(x, 1)), 0.0)
+
+
+def historical_rate(codes, fraud):
+    """
+    Frauds strictly before each row in its group / (prior rows + 1)
+
+    One cumsum over the group-contiguous order; each group's running total is
+    the global prefix minus the prefix at the group's first row.
+    """
+    order, starts, ends = group_bounds(codes)
+    sizes = ends - starts
+    fraud_sorted = fraud[order].astype(np.int64)
+    prefix = np.cumsum(fraud_sorted)
+
+    group_base = np.repeat(prefix[starts] - fraud_sorted[starts], sizes)
+    prior_fraud = prefix - fraud_sorted - group_base
+    prior_count = np.arange(len(codes)) - np.repeat(starts, sizes)
+
+    out = np.empty(len(codes), dtype=np.float64)
+    out[order] = prior_fraud / (prior_count + 1)
+    return out
+
+
+def group_row_order(codes):
+    """
+    Row positions grouped by code, ascending within each group
+
+    This is the order groupby(codes) (sorted keys) emits groups in, e.g. for
+    groupby().rolling() results.
+    """
+    return np.argsort(codes, kind='stable')
+
+
+def group_bounds(codes):
+    """
+    group_row_order(codes) plus each group's [start, end) within it
+
+    Group g's rows are order[starts[g]:ends[g]], ascending, so already in time order.
+    """
+    ends = np.cumsum(np.bincount(codes))
+    starts = ends - np.bincount(codes)
+    return group_row_order(codes), starts, ends
+
+
+#Group-wise drivers: one kernel call per group. Groups write disjoint rows, so with
+#numba they run in parallel across cores (prange). Without numba prange is range, so the
+#unique-count and percentile fallbacks still loop over groups in Python.
+def _unique_counts_by_group(order, starts, ends, times_ns, values, window_ns, out):
+    for g in prange(len(starts)):
+        idx = order[starts[g]:ends[g]]
+        out[idx] = rolling_unique_counts(times_ns[idx], values[idx], window_ns)
+
+
+def _rank_pct_by_group(order, starts, ends, ranks, out):
+    for g in prange(len(starts)):
+        idx = order[starts[g]:ends[g]]
+        out[idx] = expanding_prev_rank_pct(ranks[idx])
+
+
+def _zscore_by_group(order, starts, ends, values, out):
+    for g in prange(len(starts)):
+        idx = order[starts[g]:ends[g]]
+        out[idx] = welford_zscore(values[idx])
+
+
+if NUMBA_AVAILABLE:
+    _unique_counts_by_group = njit(parallel=True, nogil=True, cache=True)(_unique_counts_by_group)
+    _rank_pct_by_group = njit(parallel=True, nogil=True, cache=True)(_rank_pct_by_group)
+    _zscore_by_group = njit(parallel=True, nogil=True, cache=True)(_zscore_by_group)
+
+
+def scatter_rows(grouped_result, order):
+    """Put a groupby-rolling result (indexed by group, timestamp) back into row order"""
+    out = np.empty(len(order), dtype=np.float64)
+    out[order] = grouped_result.to_numpy()
+    return out
+
+
+def grouped_rolling_unique_counts(times_ns, group_codes, value_codes, window_hours):
+    """Per-group rolling unique count of value_codes over the previous window_hours (current row excluded)"""
+    window_ns = np.int64(window_hours * NS_PER_HOUR)
+    values = value_codes.astype(np.int64)
+
+    order, starts, ends = group_bounds(group_codes)
+    out = np.empty(len(times_ns), dtype=np.int64)
+    _unique_counts_by_group(order, starts, ends, times_ns, values, window_ns, out)
+    return out
+
+
+@dataclass
+class TransactionColumns:
+    """Time-sorted transaction columns as flat NumPy arrays (one array per column) for the feature kernels"""
+    ts_ns: np.ndarray       #int64 epoch nanoseconds
+    amount: np.ndarray      #float64
+    user: np.ndarray        #int32 codes
+    merchant: np.ndarray    #int32 codes
+    device: np.ndarray      #int32 codes
+    ip: np.ndarray          #int32 codes
+    country: np.ndarray     #int16 codes
+    is_fraud: np.ndarray    #uint8
+    hour: np.ndarray
+    day_of_week: np.ndarray
+    is_weekend: np.ndarray
+    is_night: np.ndarray
+
+
+def grouped_window_counts(times_ns, group_codes, window_hours):
+    """
+    Per-group rows in (t - window_hours, t] up to and including each row, like rolling(window).count()
+
+    One searchsorted over all groups at once: in group-contiguous order the key
+    group * (U + 1) + rank(t) is ascending (U distinct timestamps), and a window
+    start t - w maps to the rank of the first timestamp after it. Ranks instead
+    of raw nanoseconds keep the key far from int64 overflow.
+    """
+    window_ns = np.int64(window_hours * NS_PER_HOUR)
+    order = group_row_order(group_codes)
+    t = times_ns[order]
+    g = group_codes[order].astype(np.int64)
+
+    unique_ts, t_rank = np.unique(t, return_inverse=True)
+    stride = len(unique_ts) + 1
+    keys = g * stride + t_rank
+    window_start_rank = np.searchsorted(unique_ts, t - window_ns, side='right')
+    first_in_window = np.searchsorted(keys, g * stride + window_start_rank, side='left')
+
+    out = np.empty(len(t), dtype=np.float64)
+    out[order] = np.arange(1, len(t) + 1) - first_in_window
+    return out
+
+
+def first_seen_ns(times_ns, codes):
+    """Earliest timestamp per code (indexed by code), via one unbuffered minimum scatter"""
+    first = np.full(int(codes.max()) + 1 if len(codes) else 0, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first, codes, times_ns)
+    return first
+
+
+def grouped_minutes_since_last(times_ns, group_codes):
+    """Minutes since the group's previous row (999999 for its first row), from int64 diffs over group-contiguous order"""
+    order, starts, ends = group_bounds(group_codes)
+    t = times_ns[order]
+    minutes = np.empty(len(t), dtype=np.float64)
+    minutes[1:] = np.diff(t) / 1e9 / 60
+    minutes[starts[starts < ends]] = 999999
+
+    out = np.empty(len(t), dtype=np.float64)
+    out[order] = minutes
+    return out
+
+
+#Rows of the fused per-user output matrix
+USER_FEATURES = (
+    'feat_tx_count_user_1h',
+    'feat_tx_count_user_24h',
+    'feat_amount_sum_user_24h',
+    'feat_amount_avg_user_24h',
+    'feat_time_since_last_tx_mins',
+    'feat_country_change',
+    'feat_unique_countries_user_7d',
+    'feat_user_country_entropy',
+    'feat_user_fraud_rate_historical',
+    'feat_amount_vs_user_avg',
+    'feat_amount_percentile_user',
+)
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def user_group_features(ts_ns, amount, country, is_fraud, ranks, rows, out):
+        """
+        Every user-scoped feature for one user's time-sorted rows, in a single pass
+
+        Writes out[k, rows[i]] for each USER_FEATURES entry k. Same semantics as the
+        per-feature paths: (t - w, t] velocity windows with pandas' compensated
+        rolling sum, [t - 7d, t) unique countries, prior-row entropy / fraud rate /
+        Welford z-score, and the previous-amount rank percentile.
+        """
+        n = len(ts_ns)
+        if n == 0:
+            return
+        window_1h = NS_PER_HOUR
+        window_24h = 24 * NS_PER_HOUR
+        window_7d = 168 * NS_PER_HOUR
+
+        #Velocity state
+        left_1h = 0
+        left_24h = 0
+        sum_24h = 0.0
+        comp_add = 0.0
+        comp_remove = 0.0
+        same_run = 0
+        prev_value = amount[0]
+
+        #Unique countries in [t - 7d, t)
+        window_counts = Dict.empty(key_type=types.int64, value_type=types.int64)
+        left_7d = 0
+        right_7d = 0
+
+        #Expanding state over previous rows
+        country_counts = Dict.empty(key_type=types.int64, value_type=types.int64)
+        xlogx_sum = 0.0
+        prior_fraud = 0
+        mean = 0.0
+        m2 = 0.0
+        k = ranks.max() + 1
+        tree = np.zeros(k + 1, dtype=np.int64)
+
+        for i in range(n):
+            t = ts_ns[i]
+            x = amount[i]
+            c = np.int64(country[i])
+            r = rows[i]
+
+            #Velocity windows (t - w, t]: evict, then admit the current row
+            while ts_ns[left_1h] <= t - window_1h:
+                left_1h += 1
+            while ts_ns[left_24h] <= t - window_24h:
+                y = -amount[left_24h] - comp_remove
+                total = sum_24h + y
+                comp_remove = total - sum_24h - y
+                sum_24h = total
+                left_24h += 1
+            y = x - comp_add
+            total = sum_24h + y
+            comp_add = total - sum_24h - y
+            sum_24h = total
+            if x == prev_value:
+                same_run += 1
+            else:
+                same_run = 1
+            prev_value = x
+
+            n_24h = i - left_24h + 1
+            out[0, r] = i - left_1h + 1
+            out[1, r] = n_24h
+            if same_run >= n_24h:
+                out[2, r] = prev_value * n_24h
+                out[3, r] = prev_value
+            else:
+                out[2, r] = sum_24h
+                out[3, r] = sum_24h / n_24h
+
+            #Time since last transaction (minutes) and country change
+            if i == 0:
+                out[4, r] = 999999.0
+                out[5, r] = 1.0
+            else:
+                out[4, r] = (t - ts_ns[i - 1]) / 1e9 / 60
+                out[5, r] = 1.0 if country[i - 1] != country[i] else 0.0
+
+            #Unique countries over [t - 7d, t)
+            while right_7d < n and ts_ns[right_7d] < t:
+                v = np.int64(country[right_7d])
+                window_counts[v] = window_counts.get(v, 0) + 1
+                right_7d += 1
+            while left_7d < right_7d and ts_ns[left_7d] < t - window_7d:
+                v = np.int64(country[left_7d])
+                remaining = window_counts[v] - 1
+                if remaining == 0:
+                    del window_counts[v]
+                else:
+                    window_counts[v] = remaining
+                left_7d += 1
+            out[6, r] = len(window_counts)
+
+            #Entropy, fraud rate and z-score over the i previous rows
+            if i == 0:
+                out[7, r] = 0.0
+            else:
+                out[7, r] = np.log2(i) - xlogx_sum / i
+            out[8, r] = prior_fraud / (i + 1)
+            if i < 2:
+                out[9, r] = 0.0
+            else:
+                out[9, r] = (x - mean) / (np.sqrt(m2 / (i - 1)) + 1)
+
+            #Percentile of the previous amount among amounts up to it
+            if i == 0:
+                out[10, r] = 0.5
+            else:
+                v = ranks[i - 1]
+                j = v + 1
+                while j <= k:
+                    tree[j] += 1
+                    j += j & -j
+                less = 0
+                j = v
+                while j > 0:
+                    less += tree[j]
+                    j -= j & -j
+                less_equal = 0
+                j = v + 1
+                while j > 0:
+                    less_equal += tree[j]
+                    j -= j & -j
+                out[10, r] = (less + less_equal + 1) / (2.0 * i)
+
+            #Fold the current row into the expanding state
+            seen = country_counts.get(c, 0)
+            if seen > 0:
+                xlogx_sum -= seen * np.log2(seen)
+            xlogx_sum += (seen + 1) * np.log2(seen + 1)
+            country_counts[c] = seen + 1
+            prior_fraud += is_fraud[i]
+            delta = x - mean
+            mean += delta / (i + 1)
+            m2 += delta * (x - mean)
+
+
+    @njit(parallel=True, nogil=True, cache=True)
+    def _user_features_by_group(order, starts, ends, ts_ns, amount, country, is_fraud, ranks, out):
+        for g in prange(len(starts)):
+            idx = order[starts[g]:ends[g]]
+            user_group_features(ts_ns[idx], amount[idx], country[idx], is_fraud[idx], ranks[idx], idx, out)
+
+
+#Identifier columns factorized once, with their code widths
+ID_COLUMNS = {
+    'user_id': np.int32,
+    'merchant_id': np.int32,
+    'device_id': np.int32,
+    'ip_address': np.int32,
+    'country': np.int16,
+}
+
+
 class FraudFeatureEngine:
     """
     Feature engineering pipeline for fraud detection.
@@ -23,32 +586,128 @@ class FraudFeatureEngine:
         Args:
             df: DataFrame with columns [transaction_id, timestamp, user_id,
                 merchant_id, amount, country, device_id, ip_address, is_fraud]
+                The caller's frame is left untouched (sorting already returns a new one).
         """
-        self.df = df.copy()
-        #Sort by timestamp to ensure temporal order
-        self.df = self.df.sort_values('timestamp').reset_index(drop=True)
+        #Sort by timestamp to ensure temporal order (stable, so same-time rows keep input order)
+        self.df = df.sort_values('timestamp', kind='mergesort', ignore_index=True)
+
+        #Factorize identifiers once and keep them as categoricals built from the same codes (no second hash pass)
+        self._uniques = {}
+        codes = {}
+        for col, dtype in ID_COLUMNS.items():
+            col_codes, self._uniques[col] = pd.factorize(self.df[col], sort=False)
+            codes[col] = col_codes.astype(dtype)
+            self.df[col] = pd.Categorical.from_codes(col_codes, categories=self._uniques[col])
+
+        #Feature builders read these arrays and never touch the DataFrame until the final assign
+        self.cols = TransactionColumns(
+            ts_ns=self.df['timestamp'].to_numpy().astype('datetime64[ns]').view(np.int64),
+            amount=self.df['amount'].to_numpy(dtype=np.float64),
+            user=codes['user_id'],
+            merchant=codes['merchant_id'],
+            device=codes['device_id'],
+            ip=codes['ip_address'],
+            country=codes['country'],
+            is_fraud=self.df['is_fraud'].to_numpy(dtype=np.uint8),
+            hour=self.df['transaction_hour'].to_numpy(),
+            day_of_week=self.df['transaction_day_of_week'].to_numpy(),
+            is_weekend=self.df['is_weekend'].to_numpy(),
+            is_night=self.df['is_night'].to_numpy(),
+        )
+
+        #Compile the fused numba kernel up front so feature timings exclude JIT cost
+        if NUMBA_AVAILABLE:
+            self._fused_user_features(slice(0, 100))
+
+    def _fused_user_features(self, rows=slice(None)):
+        """USER_FEATURES for the given rows, one fused pass per user (numba only)"""
+        cols = self.cols
+        user = pd.factorize(cols.user[rows], sort=False)[0]
+        amount = cols.amount[rows]
+        order, starts, ends = group_bounds(user)
+        out = np.empty((len(USER_FEATURES), len(user)), dtype=FEATURE_DTYPE)
+        _user_features_by_group(
+            order, starts, ends, cols.ts_ns[rows], amount, cols.country[rows],
+            cols.is_fraud[rows], group_dense_ranks(user, amount), out
+        )
+        return dict(zip(USER_FEATURES, out))
+
+    def _build_user_features(self):
+        """
+        All user-scoped features (velocity, geo, historical and amount)
+
+        With numba they come from one fused pass over each user's rows; otherwise
+        each feature is computed separately.
+        """
+        if NUMBA_AVAILABLE:
+            return self._fused_user_features()
+
+        cols = self.cols
+        features = {
+            'feat_tx_count_user_1h': grouped_window_counts(cols.ts_ns, cols.user, 1),
+            'feat_tx_count_user_24h': grouped_window_counts(cols.ts_ns, cols.user, 24),
+        }
+
+        frame = pd.DataFrame({'timestamp': cols.ts_ns.view('datetime64[ns]'), 'amount': cols.amount})
+        user_24h = frame.groupby(cols.user).rolling('24h', on='timestamp')['amount']
+        user_order = group_row_order(cols.user)
+        features['feat_amount_sum_user_24h'] = scatter_rows(user_24h.sum(), user_order)
+        features['feat_amount_avg_user_24h'] = scatter_rows(user_24h.mean(), user_order)
+
+        features['feat_time_since_last_tx_mins'] = grouped_minutes_since_last(cols.ts_ns, cols.user)
+
+        features['feat_country_change'] = (
+            pd.Series(cols.country).groupby(cols.user, sort=False).shift(1).to_numpy() != cols.country
+        ).astype(int)
+        features['feat_unique_countries_user_7d'] = grouped_rolling_unique_counts(
+            cols.ts_ns, cols.user, cols.country, 168
+        )
+
+        #Over the n previous rows with per-country counts c_k: H = log2(n) - S/n, S = sum(c_k * log2(c_k)).
+        #S is a running sum: when a country's count goes c -> c+1, S grows by f(c+1) - f(c).
+        user_country = cols.user.astype(np.int64) * (int(cols.country.max()) + 1) + cols.country
+        prior_same_country = pd.Series(user_country).groupby(user_country, sort=False).cumcount().to_numpy()
+        delta = xlog2x(prior_same_country + 1) - xlog2x(prior_same_country)
+        s_prev = pd.Series(delta).groupby(cols.user, sort=False).cumsum().to_numpy() - delta
+        n_prev = pd.Series(cols.user).groupby(cols.user, sort=False).cumcount().to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy = np.log2(n_prev) - s_prev / n_prev
+        features['feat_user_country_entropy'] = np.where(n_prev > 0, entropy, 0.0)
+
+        features['feat_user_fraud_rate_historical'] = historical_rate(cols.user, cols.is_fraud)
+        features['feat_amount_vs_user_avg'] = grouped_zscore(cols.user, cols.amount)
+        features['feat_amount_percentile_user'] = grouped_expanding_rank_pct(cols.user, cols.amount)
+        return features
 
 
     def build_all_features(self):
         print("\nBUILDING FRAUD DETECTION FEATURES")
+        features = {}
+        self._user = self._build_user_features()
 
         print("\n1. Building velocity features...")
-        self.df = self._build_velocity_features(self.df)
+        features.update(self._build_velocity_features())
 
         print("2. Building device & IP risk features...")
-        self.df = self._build_device_risk_features(self.df)
+        features.update(self._build_device_risk_features())
 
         print("3. Building geolocation features...")
-        self.df = self._build_geo_features(self.df)
+        features.update(self._build_geo_features())
 
         print("4. Building historical risk features...")
-        self.df = self._build_historical_risk_features(self.df)
+        features.update(self._build_historical_risk_features())
 
         print("5. Building amount deviation features...")
-        self.df = self._build_amount_features(self.df)
+        features.update(self._build_amount_features())
 
         print("6. Building temporal features...")
-        self.df = self._build_temporal_features(self.df)
+        features.update(self._build_temporal_features())
+
+        #Attach every feature column in one go, narrowed to its output width
+        self.df = self.df.assign(**{
+            name: np.asarray(values).astype(np.uint8 if name in FLAG_FEATURES else FEATURE_DTYPE, copy=False)
+            for name, values in features.items()
+        })
 
         print("\nFeature engineering complete!")
         print(f"Total features created: {len([col for col in self.df.columns if col.startswith('feat_')])}")
@@ -56,154 +715,95 @@ class FraudFeatureEngine:
         return self.df
 
 
-    def _build_velocity_features(self, df):
+    def _build_velocity_features(self):
         """
         Velocity features: How fast is the user transacting?
 
         Fraudsters often do rapid-fire transactions (velocity attacks).
         """
 
-        #1. Transaction count in last 1 hour per user
-        df['feat_tx_count_user_1h'] = df.groupby('user_id').apply(
-            lambda x: x.rolling('1H', on='timestamp')['transaction_id'].count()
-        ).reset_index(level=0, drop=True)
-
-        #2. Transaction count in last 24 hours per user
-        df['feat_tx_count_user_24h'] = df.groupby('user_id').apply(
-            lambda x: x.rolling('24H', on='timestamp')['transaction_id'].count()
-        ).reset_index(level=0, drop=True)
-
-        #3. Total amount spent in last 24 hours per user
-        df['feat_amount_sum_user_24h'] = df.groupby('user_id').apply(
-            lambda x: x.rolling('24H', on='timestamp')['amount'].sum()
-        ).reset_index(level=0, drop=True)
-
-        #4. Average transaction amount in the last 24h per user
-        df['feat_amount_avg_user_24h'] = df.groupby('user_id').apply(
-            lambda x: x.rolling('24H', on='timestamp')['amount'].mean()
-        ).reset_index(level=0, drop=True)
+        cols = self.cols
+        features = {}
 
+        #1-2. Transaction count in last 1 / 24 hours per user
+        #3-4. Total and average amount in last 24 hours per user
         #5. Time since last transaction (in minutes)
-        df['feat_time_since_last_tx_mins'] = df.groupby('user_id')['timestamp'].diff().dt.total_seconds() / 60
-        df['feat_time_since_last_tx_mins'] = df['feat_time_since_last_tx_mins'].fillna(999999)
+        #(user-scoped, from _build_user_features)
+        for name in ('feat_tx_count_user_1h', 'feat_tx_count_user_24h', 'feat_amount_sum_user_24h',
+                     'feat_amount_avg_user_24h', 'feat_time_since_last_tx_mins'):
+            features[name] = self._user[name]
 
         #6. Transaction count per merchant in last 1h
-        df['feat_tx_count_merchant_1h'] = df.groupby('merchant_id').apply(
-            lambda x: x.rolling('1H', on='timestamp')['transaction_id'].count()
-        ).reset_index(level=0, drop=True)
+        features['feat_tx_count_merchant_1h'] = grouped_window_counts(cols.ts_ns, cols.merchant, 1)
 
-        return df
+        return features
 
 
-    def _build_device_risk_features(self, df):
+    def _build_device_risk_features(self):
         """
         Device & IP risk features
 
         Fraudsters often reuse devices/IPs across multiple accounts.
         """
 
-        #Helper function for rolling unique counts
-        def rolling_unique_count(group, time_col, value_col, window_hours):
-            """Count unique values in rolling time window"""
-            result = []
-            for idx, row in group.iterrows():
-                current_time = row[time_col]
-                window_start = current_time - pd.Timedelta(hours=window_hours)
-
-                #Get rows in window (excluding current row to prevent leakage)
-                mask = (group[time_col] >= window_start) & (group[time_col] < current_time)
-                unique_count = group.loc[mask, value_col].nunique()
-                result.append(unique_count)
+        cols = self.cols
+        features = {}
 
-            return pd.Series(result, index=group.index)
+        #Rolling unique counts exclude the current row to prevent leakage
 
         #1. Unique users per device in last 24h
-        df['feat_unique_users_per_device_24h'] = df.groupby('device_id', group_keys=False).apply(
-            lambda x: rolling_unique_count(x, 'timestamp', 'user_id', 24)
+        features['feat_unique_users_per_device_24h'] = grouped_rolling_unique_counts(
+            cols.ts_ns, cols.device, cols.user, 24
         )
 
         #2. Unique countries per device in last 7 days (168 hours)
-        df['feat_unique_countries_per_device_7d'] = df.groupby('device_id', group_keys=False).apply(
-            lambda x: rolling_unique_count(x, 'timestamp', 'country', 168)
+        features['feat_unique_countries_per_device_7d'] = grouped_rolling_unique_counts(
+            cols.ts_ns, cols.device, cols.country, 168
         )
 
         #3. Unique users per IP in last 24h
-        df['feat_unique_users_per_ip_24h'] = df.groupby('ip_address', group_keys=False).apply(
-            lambda x: rolling_unique_count(x, 'timestamp', 'user_id', 24)
+        features['feat_unique_users_per_ip_24h'] = grouped_rolling_unique_counts(
+            cols.ts_ns, cols.ip, cols.user, 24
         )
 
         #4. Device age (days since first seen)
-        device_first_seen = df.groupby('device_id')['timestamp'].transform('min')
-        df['feat_device_age_days'] = (df['timestamp'] - device_first_seen).dt.total_seconds() / (24 * 3600)
+        device_first_seen = first_seen_ns(cols.ts_ns, cols.device)
+        features['feat_device_age_days'] = (cols.ts_ns - device_first_seen[cols.device]) / 1e9 / (24 * 3600)
 
         #5. IP address age (days since first seen)
-        ip_first_seen = df.groupby('ip_address')['timestamp'].transform('min')
-        df['feat_ip_age_days'] = (df['timestamp'] - ip_first_seen).dt.total_seconds() / (24 * 3600)
+        ip_first_seen = first_seen_ns(cols.ts_ns, cols.ip)
+        features['feat_ip_age_days'] = (cols.ts_ns - ip_first_seen[cols.ip]) / 1e9 / (24 * 3600)
 
-        return df
+        return features
 
-    def _build_geo_features(self, df):
+    def _build_geo_features(self):
         """
         Geolocation features
 
         Detect impossible travel and country hopping.
         """
 
-        #Helper function for rolling unique counts (reuse from device features)
-        def rolling_unique_count(group, time_col, value_col, window_hours):
-            """Count unique values in rolling time window"""
-            result = []
-            for idx, row in group.iterrows():
-                current_time = row[time_col]
-                window_start = current_time - pd.Timedelta(hours=window_hours)
-
-                #Get rows in window (excluding current row)
-                mask = (group[time_col] >= window_start) & (group[time_col] < current_time)
-                unique_count = group.loc[mask, value_col].nunique()
-                result.append(unique_count)
-
-            return pd.Series(result, index=group.index)
+        cols = self.cols
+        features = {}
 
         #1. Country change flag (did user change countries since last tx?)
-        df['feat_country_change'] = (
-            df.groupby('user_id')['country'].shift(1) != df['country']
-        ).astype(int)
+        features['feat_country_change'] = self._user['feat_country_change']
 
         #2. Number of unique countries per user in last 7 days
-        df['feat_unique_countries_user_7d'] = df.groupby('user_id', group_keys=False).apply(
-            lambda x: rolling_unique_count(x, 'timestamp', 'country', 168)
-        )
+        features['feat_unique_countries_user_7d'] = self._user['feat_unique_countries_user_7d']
 
-        #3. High-risk country flag
+        #3. High-risk country flag (0/1 lookup table over the country codes)
         HIGH_RISK_COUNTRIES = ['NG', 'PK', 'BD', 'VN', 'ID']
-        df['feat_is_high_risk_country'] = df['country'].isin(HIGH_RISK_COUNTRIES).astype(int)
+        risk_mask = np.asarray(pd.Index(self._uniques['country']).isin(HIGH_RISK_COUNTRIES), dtype=np.uint8)
+        features['feat_is_high_risk_country'] = risk_mask[cols.country]
 
         #4. Country entropy (diversity of countries for this user historically)
-        def calculate_expanding_entropy(group):
-            """Calculate entropy for each row using all previous rows"""
-            result = []
-            for i in range(len(group)):
-                if i == 0:
-                    result.append(0)
-                else:
-                    #Get all countries up to (but not including) current row
-                    countries = group.iloc[:i]['country'].values
-                    if len(countries) == 0:
-                        result.append(0)
-                    else:
-                        value_counts = pd.Series(countries).value_counts(normalize=True)
-                        entropy = -sum(value_counts * np.log2(value_counts + 1e-9))
-                        result.append(entropy)
-            return pd.Series(result, index=group.index)
-
-        df['feat_user_country_entropy'] = df.groupby('user_id', group_keys=False).apply(
-            calculate_expanding_entropy
-        )
+        features['feat_user_country_entropy'] = self._user['feat_user_country_entropy']
 
-        return df
+        return features
 
 
-    def _build_historical_risk_features(self, df):
+    def _build_historical_risk_features(self):
         """
         Historical risk features
 
@@ -214,120 +814,142 @@ class FraudFeatureEngine:
         #For this implementation, we'll use a simplified approach
         #In production, you'd need to account for label delay properly
 
-        #1. User's historical fraud rate (last 30 days, excluding current transaction)
-        #We'll calculate this using an expanding window approach
+        cols = self.cols
 
-        #First, create a shifted fraud indicator (exclude current transaction)
-        df['_is_fraud_shifted'] = df.groupby('user_id')['is_fraud'].shift(1)
+        #1-3. Historical fraud rate per user / merchant / device (excluding current transaction)
+        return {
+            'feat_user_fraud_rate_historical': self._user['feat_user_fraud_rate_historical'],
+            'feat_merchant_fraud_rate_historical': historical_rate(cols.merchant, cols.is_fraud),
+            'feat_device_fraud_rate_historical': historical_rate(cols.device, cols.is_fraud),
+        }
 
-        #Calculate cumulative fraud count and transaction count per user
-        df['_cum_fraud_count'] = df.groupby('user_id')['_is_fraud_shifted'].cumsum()
-        df['_cum_tx_count'] = df.groupby('user_id').cumcount()
 
-        #Fraud rate = cumulative frauds / cumulative transactions
-        df['feat_user_fraud_rate_historical'] = df['_cum_fraud_count'] / (df['_cum_tx_count'] + 1)
-        df['feat_user_fraud_rate_historical'] = df['feat_user_fraud_rate_historical'].fillna(0)
-
-        #2. Merchant's historical fraud rate
-        df['_merchant_fraud_shifted'] = df.groupby('merchant_id')['is_fraud'].shift(1)
-        df['_cum_merchant_fraud'] = df.groupby('merchant_id')['_merchant_fraud_shifted'].cumsum()
-        df['_cum_merchant_tx'] = df.groupby('merchant_id').cumcount()
-
-        df['feat_merchant_fraud_rate_historical'] = df['_cum_merchant_fraud'] / (df['_cum_merchant_tx'] + 1)
-        df['feat_merchant_fraud_rate_historical'] = df['feat_merchant_fraud_rate_historical'].fillna(0)
-
-        #3. Device historical fraud rate
-        df['_device_fraud_shifted'] = df.groupby('device_id')['is_fraud'].shift(1)
-        df['_cum_device_fraud'] = df.groupby('device_id')['_device_fraud_shifted'].cumsum()
-        df['_cum_device_tx'] = df.groupby('device_id').cumcount()
-
-        df['feat_device_fraud_rate_historical'] = df['_cum_device_fraud'] / (df['_cum_device_tx'] + 1)
-        df['feat_device_fraud_rate_historical'] = df['feat_device_fraud_rate_historical'].fillna(0)
-
-        #Clean up temporary columns
-        df = df.drop(columns=[col for col in df.columns if col.startswith('_')])
-
-        return df
-
-
-    def _build_amount_features(self, df):
+    def _build_amount_features(self):
         """
         Amount-based features
 
         Detect unusual spending patterns.
         """
 
+        cols = self.cols
+        features = {}
+
         #1. Amount deviation from user's average
-        df['feat_amount_vs_user_avg'] = df.groupby('user_id')['amount'].transform(
-            lambda x: (x - x.expanding().mean().shift(1)) / (x.expanding().std().shift(1) + 1)
-        )
-        df['feat_amount_vs_user_avg'] = df['feat_amount_vs_user_avg'].fillna(0)
+        features['feat_amount_vs_user_avg'] = self._user['feat_amount_vs_user_avg']
 
         #2. Amount deviation from merchant's average
-        df['feat_amount_vs_merchant_avg'] = df.groupby('merchant_id')['amount'].transform(
-            lambda x: (x - x.expanding().mean().shift(1)) / (x.expanding().std().shift(1) + 1)
-        )
-        df['feat_amount_vs_merchant_avg'] = df['feat_amount_vs_merchant_avg'].fillna(0)
+        features['feat_amount_vs_merchant_avg'] = grouped_zscore(cols.merchant, cols.amount)
 
         #3. Is this a small test transaction? (< $10)
-        df['feat_is_small_amount'] = (df['amount'] < 10).astype(int)
+        #(comparisons write straight into the uint8 output, no bool/int64 intermediates)
+        is_small = np.empty(len(cols.amount), dtype=np.uint8)
+        np.less(cols.amount, 10, out=is_small.view(bool))
+        features['feat_is_small_amount'] = is_small
 
         #4. Is this a large transaction? (> $500)
-        df['feat_is_large_amount'] = (df['amount'] > 500).astype(int)
+        is_large = np.empty(len(cols.amount), dtype=np.uint8)
+        np.greater(cols.amount, 500, out=is_large.view(bool))
+        features['feat_is_large_amount'] = is_large
 
         #5. Amount percentile for this user
-        df['feat_amount_percentile_user'] = df.groupby('user_id')['amount'].transform(
-            lambda x: x.expanding().apply(lambda y: pd.Series(y[:-1]).rank(pct=True).iloc[-1] if len(y) > 1 else 0.5, raw=False)
-        )
+        #(rank of the previous amount among the user's amounts up to it; incremental, O(N log N))
+        features['feat_amount_percentile_user'] = self._user['feat_amount_percentile_user']
 
-        return df
+        return features
 
 
-    def _build_temporal_features(self, df):
+    def _build_temporal_features(self):
         """
         Time-based features
 
         Fraud patterns vary by time.
         """
 
-        #These are already in the dataset but let's make them explicit features
-        df['feat_hour'] = df['transaction_hour']
-        df['feat_day_of_week'] = df['transaction_day_of_week']
-        df['feat_is_weekend'] = df['is_weekend']
-        df['feat_is_night'] = df['is_night']
+        cols = self.cols
+        features = {}
 
-        #Add cyclical encoding for hour (sine/cosine transformation)
-        df['feat_hour_sin'] = np.sin(2 * np.pi * df['feat_hour'] / 24)
-        df['feat_hour_cos'] = np.cos(2 * np.pi * df['feat_hour'] / 24)
+        #These are already in the dataset but let's make them explicit features
+        features['feat_hour'] = cols.hour
+        features['feat_day_of_week'] = cols.day_of_week
+        features['feat_is_weekend'] = cols.is_weekend
+        features['feat_is_night'] = cols.is_night
 
-        #Add cyclical encoding for day of week
-        df['feat_day_sin'] = np.sin(2 * np.pi * df['feat_day_of_week'] / 7)
-        df['feat_day_cos'] = np.cos(2 * np.pi * df['feat_day_of_week'] / 7)
+        #Cyclical encoding for hour and day of week (table gathers, no per-row sin/cos)
+        hour = cols.hour.astype(np.intp)
+        day = cols.day_of_week.astype(np.intp)
+        features['feat_hour_sin'] = HOUR_SIN[hour]
+        features['feat_hour_cos'] = HOUR_COS[hour]
+        features['feat_day_sin'] = DAY_SIN[day]
+        features['feat_day_cos'] = DAY_COS[day]
 
-        return df
+        return features
 
 
     def get_feature_columns(self):
         """Return list of feature columns"""
         return [col for col in self.df.columns if col.startswith('feat_')]
 
-    def save_features(self, output_path):
-        """Save engineered features to CSV"""
-        self.df.to_csv(output_path, index=False)
+    def save_features(self, output_path, format='parquet'):
+        """
+        Save engineered features
+
+        Args:
+            output_path: Destination file
+            format: 'parquet' (zstd, dictionary-encoded strings), 'feather' or 'csv'
+        """
+        if format == 'parquet':
+            self.df.to_parquet(output_path, engine='pyarrow', index=False, compression='zstd',
+                               row_group_size=1_000_000, use_dictionary=True)
+        elif format == 'feather':
+            self.df.to_feather(output_path, compression='zstd')
+        elif format == 'csv':
+            self.df.to_csv(output_path, index=False)
+        else:
+            raise ValueError(f"Unknown feature file format: {format}")
         print(f"\nFeatures saved to: {output_path}")
         print(f"Shape: {self.df.shape}")
         print(f"Features: {len(self.get_feature_columns())}")
 
 
+def load_transactions(path):
+    """
+    Load raw transactions with parsed timestamps
+
+    pyarrow's multithreaded C++ reader parses the timestamps while reading and
+    dictionary-encodes the identifier columns (categoricals in pandas); without
+    pyarrow it falls back to read_csv + to_datetime.
+    """
+    if pa is None:
+        df = pd.read_csv(path)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df['chargeback_date'] = pd.to_datetime(df['chargeback_date'])
+        return df
+
+    id_type = pa.dictionary(pa.int32(), pa.string())
+    convert_options = pacsv.ConvertOptions(
+        timestamp_parsers=['%Y-%m-%d %H:%M:%S'],
+        column_types={
+            'timestamp': pa.timestamp('ns'),
+            'chargeback_date': pa.timestamp('ns'),
+            'is_fraud': pa.uint8(),
+            'user_id': id_type,
+            'merchant_id': id_type,
+            'device_id': id_type,
+            'ip_address': id_type,
+            'country': id_type,
+        },
+    )
+    table = pacsv.read_csv(path, convert_options=convert_options)
+    return table.to_pandas(self_destruct=True, split_blocks=True)
+
+
 def main():
     """Main execution"""
     print("\nFRAUD DETECTION FEATURE ENGINEERING PIPELINE\n")
 
     #Load raw data
     print("\nLoading data...")
-    df = pd.read_csv('../data/raw/transactions.csv')
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df['chargeback_date'] = pd.to_datetime(df['chargeback_date'])
+    df = load_transactions('../data/raw/transactions.csv')
 
     print(f"Loaded {len(df):,} transactions")
     print(f"Date range: {df['timestamp'].min()} to {df['timestamp'].max()}")
@@ -370,7 +992,7 @@ def main():
         print("\nNo missing values in features!")
 
     #Save processed data
-    engine.save_features('../data/processed/transactions_with_features.csv')
+    engine.save_features('../data/processed/transactions_with_features.parquet')
 
     print("\nFEATURE ENGINEERING COMPLETE!")
     print("\nKey Points:")
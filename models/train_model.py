@@ -199,6 +199,12 @@ class FraudModelTrainer:
 
         print(f"\nModel saved to: {output_path}")
 
+        #Native LightGBM text format - loaded directly by the API (no unpickling)
+        if isinstance(model, lgb.Booster):
+            native_path = f'../models/trained/{model_name}.txt'
+            model.save_model(native_path)
+            print(f"Native model saved to: {native_path}")
+
         return output_path
 
 def main():
@@ -250,6 +256,7 @@ def main():
     print("\nModels saved:")
     print(" - models/trained/logistic_regression_baseline.pkl")
     print(" - models/trained/lightgbm_production.pkl")
+    print(" - models/trained/lightgbm_production.txt")
     print(" - models/trained/feature_info.pkl")
     print("\nNext step: Run evaluation")
     print(" - python evaluation/evaluate_model.py")
@@ -0,0 +1,159 @@
+"""
+User-scoped features from the fused numba kernel and the numba-free fallback,
+checked against a plain pandas groupby/rolling reference
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_engineering import build_features_old
+from feature_engineering.build_features_old import USER_FEATURES
+
+MODULE_PATH = Path(build_features_old.__file__)
+
+
+def make_transactions(seed=7, n=400):
+    """Seeded sample with tied timestamps and amounts, single-transaction users and one all-equal-timestamp user"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2024-01-01')
+
+    #Minute offsets on a coarse grid so many rows share a timestamp
+    minutes = rng.integers(0, 10 * 24 * 60, n) // 15 * 15
+    df = pd.DataFrame({
+        'transaction_id': [f'tx_{i}' for i in range(n)],
+        'timestamp': start + pd.to_timedelta(minutes, unit='min'),
+        'user_id': rng.choice([f'user_{i}' for i in range(25)], n),
+        'merchant_id': rng.choice([f'merchant_{i}' for i in range(10)], n),
+        'amount': rng.choice([5.0, 19.99, 50.0, 120.5, 999.0], n) + rng.integers(0, 3, n),
+        'country': rng.choice(['US', 'GB', 'NG', 'IN'], n),
+        'device_id': rng.choice([f'device_{i}' for i in range(40)], n),
+        'ip_address': rng.choice([f'10.0.0.{i}' for i in range(40)], n),
+        'is_fraud': (rng.random(n) < 0.1).astype(int),
+    })
+
+    #Single-transaction users
+    singles = df.iloc[:5].copy()
+    singles['user_id'] = [f'single_{i}' for i in range(5)]
+
+    #One user whose rows all share a timestamp
+    burst = df.iloc[5:17].copy()
+    burst['user_id'] = 'burst_user'
+    burst['timestamp'] = start + pd.Timedelta(days=3)
+
+    df = pd.concat([df, singles, burst], ignore_index=True)
+    df['transaction_id'] = [f'tx_{i}' for i in range(len(df))]
+    df['transaction_hour'] = df['timestamp'].dt.hour
+    df['transaction_day_of_week'] = df['timestamp'].dt.dayofweek
+    df['is_weekend'] = (df['transaction_day_of_week'] >= 5).astype(int)
+    df['is_night'] = ((df['transaction_hour'] < 6) | (df['transaction_hour'] >= 22)).astype(int)
+    return df
+
+
+def entropy_of_previous(countries):
+    """Shannon entropy of the countries before each row"""
+    out = []
+    for i in range(len(countries)):
+        p = pd.Series(countries[:i]).value_counts(normalize=True).to_numpy()
+        out.append(-(p * np.log2(p)).sum() if i else 0.0)
+    return out
+
+
+def unique_countries_7d(group):
+    """Distinct countries in [t - 7d, t) for each row"""
+    ts = group['timestamp']
+    return [
+        group.loc[(ts >= t - pd.Timedelta(hours=168)) & (ts < t), 'country'].nunique()
+        for t in ts
+    ]
+
+
+def reference_user_features(df):
+    """USER_FEATURES computed directly with pandas, row-aligned with df"""
+    user = df.groupby('user_id', sort=False)
+
+    def rolling(window, agg):
+        """Per-user time-window aggregate of amount, keyed by the original row index"""
+        result = user[['timestamp', 'amount']].apply(
+            lambda g: getattr(g.rolling(window, on='timestamp')['amount'], agg)()
+        )
+        return result.droplevel(0).reindex(df.index).to_numpy()
+
+    amount = user['amount']
+    prev_mean = amount.transform(lambda x: x.expanding().mean().shift(1))
+    prev_std = amount.transform(lambda x: x.expanding().std().shift(1))
+    prior_fraud = user['is_fraud'].shift(1).groupby(df['user_id'], sort=False).cumsum()
+
+    return {
+        'feat_tx_count_user_1h': rolling('1h', 'count'),
+        'feat_tx_count_user_24h': rolling('24h', 'count'),
+        'feat_amount_sum_user_24h': rolling('24h', 'sum'),
+        'feat_amount_avg_user_24h': rolling('24h', 'mean'),
+        'feat_time_since_last_tx_mins': (
+            user['timestamp'].diff().dt.total_seconds().div(60).fillna(999999).to_numpy()
+        ),
+        'feat_country_change': (user['country'].shift(1) != df['country']).astype(int).to_numpy(),
+        'feat_unique_countries_user_7d': (
+            user[['timestamp', 'country']]
+            .apply(lambda g: pd.Series(unique_countries_7d(g), index=g.index))
+            .droplevel(0).reindex(df.index).to_numpy()
+        ),
+        'feat_user_country_entropy': (
+            user['country'].transform(lambda x: pd.Series(entropy_of_previous(x.to_numpy()), index=x.index))
+            .to_numpy()
+        ),
+        'feat_user_fraud_rate_historical': (
+            (prior_fraud / (user.cumcount() + 1)).fillna(0).to_numpy()
+        ),
+        'feat_amount_vs_user_avg': ((df['amount'] - prev_mean) / (prev_std + 1)).fillna(0).to_numpy(),
+        'feat_amount_percentile_user': amount.transform(
+            lambda x: x.expanding().apply(
+                lambda y: pd.Series(y[:-1]).rank(pct=True).iloc[-1] if len(y) > 1 else 0.5, raw=False
+            )
+        ).to_numpy(),
+    }
+
+
+@pytest.fixture(scope='module')
+def transactions():
+    return make_transactions()
+
+
+@pytest.fixture(scope='module')
+def reference(transactions):
+    df = transactions.sort_values('timestamp', kind='mergesort', ignore_index=True)
+    return reference_user_features(df)
+
+
+@pytest.fixture
+def fallback_module(monkeypatch):
+    """A fresh copy of build_features_old imported with numba unavailable"""
+    monkeypatch.setitem(sys.modules, 'numba', None)
+    spec = importlib.util.spec_from_file_location('build_features_old_no_numba', MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert not module.NUMBA_AVAILABLE
+    return module
+
+
+def assert_matches_reference(features, reference):
+    for name in USER_FEATURES:
+        np.testing.assert_allclose(
+            np.asarray(features[name], dtype=np.float64), reference[name],
+            rtol=1e-6, atol=1e-6, err_msg=name
+        )
+
+
+@pytest.mark.skipif(not build_features_old.NUMBA_AVAILABLE, reason='numba not installed')
+def test_fused_numba_user_features_match_pandas(transactions, reference):
+    engine = build_features_old.FraudFeatureEngine(transactions)
+    assert_matches_reference(engine._build_user_features(), reference)
+
+
+def test_fallback_user_features_match_pandas(fallback_module, transactions, reference):
+    engine = fallback_module.FraudFeatureEngine(transactions)
+    assert_matches_reference(engine._build_user_features(), reference)